@@ -1,19 +1,31 @@
 import asyncio
 import os
-import re
+import shutil
 import subprocess
-from typing import List
+import time
+from typing import List, Literal, Optional, Tuple, get_args
 import logging
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 import uvicorn
 
-from moviepy import concatenate_videoclips, VideoFileClip
 from pydantic_ai import Agent
 from pydantic_ai.models.gemini import GeminiModel
+from pydantic_ai.models.test import TestModel
 from pydantic_ai.providers.google_gla import GoogleGLAProvider
-from config import api_key
+from utils.autofix import AutoFixer, Fix, error_signature
+from utils.concat import concatenate_videos
+from utils.hls import MASTER_PLAYLIST, HLSWriter
+from utils.jobs import Job, JobManager, JobState
+from utils.llm_cache import CachedAgent, NullCache, build_llm_cache
+from utils.media_store import MediaEntry, MediaFileResponse, MediaStore
+from utils.providers import get_provider, render_provider_metrics
+from utils.render_cache import RenderCache
+from utils.tracing import metrics, span
+from utils.renderer import DEFAULT_QUALITY, DRAFT_QUALITY, WORK_ROOT, discard_incomplete_partial, get_render_pool, partial_movie_files, render_manim_scene, render_timeout
+from utils.validation import ManimCodeError, manim_exports, validate_manim_code
+from utils.warm_workers import WARM_WORKERS_ENABLED, WarmWorkerPool
 import nest_asyncio
 
 nest_asyncio.apply()
@@ -26,16 +38,66 @@ app = FastAPI(
     version="1.0.0"
 )
 
-gemini_llm = GeminiModel('gemini-2.0-flash', provider=GoogleGLAProvider(api_key=api_key))
+render_cache = RenderCache()
+autofixer = AutoFixer()
+media_store = MediaStore()
+warm_pool = WarmWorkerPool()
+
+LLM_MODEL = os.environ.get("MANIM_LLM_MODEL", "gemini-2.0-flash")
+# Deterministic fixes per chapter, on top of the LLM fixer's attempts, and how much stderr is kept for the fixer and job status.
+MAX_AUTOFIXES = 3
+MAX_ERROR_CHARS = 4000
+# The outline asks for 30-60 second chapters; the duration comes from the LLM and sets the render timeout, so it is bounded.
+MAX_CHAPTER_SECONDS = 120
+CodegenMode = Literal["sequential", "concurrent", "batch"]
+CODEGEN_MODE = os.environ.get("MANIM_CODEGEN_MODE", "sequential")
+OutputFormat = Literal["mp4", "hls"]
+OUTPUT_FORMAT = os.environ.get("MANIM_OUTPUT_FORMAT", "mp4")
+# These are Field defaults, which pydantic doesn't validate, so a typo would otherwise silently fall back to another mode.
+if CODEGEN_MODE not in get_args(CodegenMode):
+    raise ValueError(f"MANIM_CODEGEN_MODE must be one of {', '.join(get_args(CodegenMode))}, got {CODEGEN_MODE!r}")
+if OUTPUT_FORMAT not in get_args(OutputFormat):
+    raise ValueError(f"MANIM_OUTPUT_FORMAT must be one of {', '.join(get_args(OutputFormat))}, got {OUTPUT_FORMAT!r}")
+
+DEFAULT_PREWARM_TOPICS = [
+    "Complex numbers",
+    "Surface area of a cube",
+    "Derivatives",
+    "Eigenvalues and eigenvectors",
+    "Matrix operations",
+    "The Pythagorean theorem",
+    "Quadratic functions",
+    "Volume of a sphere",
+    "Surface plots of functions of two variables",
+    "The unit circle",
+]
+
+def build_llm():
+    if LLM_MODEL == "test":
+        return TestModel()
+    from config import api_key
+    return GeminiModel(LLM_MODEL, provider=GoogleGLAProvider(api_key=api_key))
+
+gemini_llm = build_llm()
 
 class VideoRequest(BaseModel):
     prompt: str = Field(..., description="The concept or topic to generate a video for")
     video_name: str = Field(default="generated_video", description="Name for the output video file")
+    quality: Literal["l", "m", "h", "k"] = Field(default=DEFAULT_QUALITY, description="Manim render quality: l (480p15), m (720p30), h (1080p60) or k (2160p60)")
+    fps: Optional[int] = Field(default=None, ge=1, le=120, description="Frame rate override for the chosen quality")
+    draft: bool = Field(default=False, description="Render a low-quality preview first, then re-render the passing chapters at the requested quality")
+    codegen_mode: CodegenMode = Field(default=CODEGEN_MODE, description="sequential (one codegen call after another), concurrent (all codegen calls at once) or batch (outline and every chapter's code in one call)")
+    output_format: OutputFormat = Field(default=OUTPUT_FORMAT, description="mp4 (one file after every chapter has rendered) or hls (chapters are streamed as they render)")
 
-class VideoResponse(BaseModel):
+class JobSubmitResponse(BaseModel):
     message: str
-    video_path: str
+    job_id: str
     status: str
+    status_url: str
+    events_url: str
+
+class PrewarmRequest(BaseModel):
+    topics: List[str] = Field(default_factory=lambda: list(DEFAULT_PREWARM_TOPICS), description="Prompts to run through the outline and codegen agents")
 
 class HealthResponse(BaseModel):
     status: str
@@ -43,6 +105,7 @@ class HealthResponse(BaseModel):
 
 class ChapterDescription(BaseModel):
     title: str = Field(description="Title of the chapter.")
+    duration_seconds: int = Field(default=45, ge=1, le=MAX_CHAPTER_SECONDS, description="Expected length of the chapter's animation in seconds.")
     explanation: str = Field(description="Detailed explanation of the chapter's content, including how Manim should visualize it. Be very specific with Manim instructions, including animations, shapes, positions, colors, and timing. Include LaTeX for mathematical formulas. Specify scene transitions.")
 
 class VideoOutline(BaseModel):
@@ -52,10 +115,14 @@ class VideoOutline(BaseModel):
 class ManimCode(BaseModel):
     code: str = Field(description="Complete Manim code for the chapter. Include all necessary imports. The code should create a single scene. Add comments to explain the code. Do not include any comments that are not valid Python comments. Ensure the code is runnable.")
 
-outline_agent = Agent(
-    model=gemini_llm,
-    result_type=VideoOutline,
-    system_prompt="""
+class ChapterScript(ChapterDescription):
+    code: str = Field(description=ManimCode.model_fields["code"].description)
+
+class VideoScript(BaseModel):
+    title: str = Field(description="Title of the entire video.")
+    chapters: List[ChapterScript] = Field(description="List of chapters in the video, each with its complete Manim code.")
+
+OUTLINE_SYSTEM_PROMPT = """
     You are an expert educational content creator specializing in creating engaging video outlines for complex topics.
     
     Your task is to break down any concept into 2-3 clear, progressive chapters that build understanding step-by-step.
@@ -70,16 +137,19 @@ outline_agent = Agent(
        - Color schemes (use specific colors like RED, BLUE, GREEN, YELLOW)
        - Mathematical formulas in LaTeX format
        - Scene transitions and camera movements
+    3. The expected duration of the chapter's animation in seconds
     
     Focus on creating visual stories that make abstract concepts concrete and memorable.
     Use progressive complexity: start simple, build to more complex visualizations.
     """
-)
 
-manim_agent = Agent(
+outline_agent = Agent(
     model=gemini_llm,
-    result_type=ManimCode,
-    system_prompt="""
+    result_type=VideoOutline,
+    system_prompt=OUTLINE_SYSTEM_PROMPT
+)
+
+MANIM_SYSTEM_PROMPT = """
     You are a Manim expert specializing in creating beautiful, educational animations.
     
     Generate complete, runnable Manim code that:
@@ -100,12 +170,14 @@ manim_agent = Agent(
     - Ensure proper indentation and formatting
     - Test for common Manim patterns and best practices
     """
-)
 
-code_fixer_agent = Agent(
+manim_agent = Agent(
     model=gemini_llm,
     result_type=ManimCode,
-    system_prompt="""
+    system_prompt=MANIM_SYSTEM_PROMPT
+)
+
+CODE_FIXER_SYSTEM_PROMPT = """
     You are a Manim debugging expert with deep knowledge of common errors and their solutions.
     
     Analyze the provided error message and code to:
@@ -124,123 +196,301 @@ code_fixer_agent = Agent(
     
     Always preserve the educational intent while ensuring technical correctness.
     """
+
+code_fixer_agent = Agent(
+    model=gemini_llm,
+    result_type=ManimCode,
+    system_prompt=CODE_FIXER_SYSTEM_PROMPT
+)
+
+BATCH_SYSTEM_PROMPT = OUTLINE_SYSTEM_PROMPT + """
+    For every chapter, also write the complete Manim code that animates it, in the chapter's code field.
+    """ + MANIM_SYSTEM_PROMPT
+
+batch_agent = Agent(
+    model=gemini_llm,
+    result_type=VideoScript,
+    system_prompt=BATCH_SYSTEM_PROMPT
 )
 
-def create_manim_code(chapter: ChapterDescription) -> str:
+llm_cache = build_llm_cache()
+gemini_provider = get_provider("gemini")
+cached_outline_agent = CachedAgent("outline", outline_agent, OUTLINE_SYSTEM_PROMPT, VideoOutline, llm_cache, provider=gemini_provider)
+cached_manim_agent = CachedAgent("manim", manim_agent, MANIM_SYSTEM_PROMPT, ManimCode, llm_cache, provider=gemini_provider)
+# Fixes that rendered are already replayed by error signature from the autofix store; an unverified fix is not worth caching.
+cached_code_fixer_agent = CachedAgent("code_fixer", code_fixer_agent, CODE_FIXER_SYSTEM_PROMPT, ManimCode, NullCache(), provider=gemini_provider)
+cached_batch_agent = CachedAgent("batch", batch_agent, BATCH_SYSTEM_PROMPT, VideoScript, llm_cache, provider=gemini_provider)
+
+def manim_prompt(chapter: ChapterDescription) -> str:
+    return f"Title: {chapter.title}. Visualization: {chapter.explanation}"
+
+async def create_manim_code(chapter: ChapterDescription) -> str:
     logging.info(f"Creating Manim code for chapter: {chapter.title}")
-    result = manim_agent.run_sync(f"Title: {chapter.title}. Visualization: {chapter.explanation}")
-    return result.data.code
+    result = await cached_manim_agent.run(manim_prompt(chapter))
+    return result.code
 
-def debug_manim_code(error: str, code: str) -> str:
+async def debug_manim_code(error: str, code: str) -> str:
     logging.info(f"Debugging Manim code due to error: {error}")
-    result = code_fixer_agent.run_sync(f"Error: {error}\nCode: {code}")
-    return result.data.code
-
-def create_video_outline(concept: str) -> VideoOutline:
+    result = await cached_code_fixer_agent.run(f"Error: {error}\nCode: {code}")
+    return result.code
+
+async def fix_manim_code(error: str, code: str, allow_autofix: bool = True) -> Fix:
+    """Try the deterministic and remembered fixes for this error signature before asking the fixer agent."""
+    with span("stage.fix") as current:
+        fix = autofixer.fix(error, code) if allow_autofix else None
+        if fix is None:
+            fix = Fix(error_signature(error), code, await debug_manim_code(error, code))
+        current.set(source=fix.source, signature=fix.signature)
+        return fix
+
+async def create_video_outline(concept: str) -> VideoOutline:
     logging.info(f"Creating video outline for: {concept}")
-    result = outline_agent.run_sync(concept)
-    return result.data
+    return await cached_outline_agent.run(concept)
 
-def render_manim_scene(code: str, chapter_num: int) -> str:
-    with open("temp.py", "w") as f:
-        f.write(code)
-        temp_file = f.name
+async def create_video_script(concept: str) -> VideoScript:
+    logging.info(f"Creating video outline and chapter code for: {concept}")
+    return await cached_batch_agent.run(concept)
 
-    process = None
-    try:
-        command = ["manim", temp_file, "-ql", "--disable_caching"]
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, text=True)
-        stdout, stderr = process.communicate(timeout=60)
-
-        if process.returncode == 0:
-            logging.info(f"Manim render successful for chapter {chapter_num}")
-            logging.debug(f"Manim stdout: {stdout}")
-            logging.debug(f"Manim stderr: {stderr}")
-        else:
-            error_msg = f"Manim render failed for chapter {chapter_num} with return code {process.returncode}: {stdout} {stderr}"
-            logging.error(error_msg.split('\n')[-1])
-            raise subprocess.CalledProcessError(process.returncode, command, output=stdout.encode(), stderr=stderr.encode())
-
-    except subprocess.TimeoutExpired:
-        logging.error(f"Manim process timed out for chapter {chapter_num}")
-        process.kill() if process else None
-        raise
-    except FileNotFoundError:
-        logging.error("Manim command not found. Ensure Manim is installed and in PATH.")
-        raise
-
-    match = re.search(r"class\s+(\w+)\(Scene\):", code)
-    class_name = match.group(1) if match else None
-    return f"{class_name}.mp4" if class_name else ValueError(f"Could not extract class name from Manim code for chapter {chapter_num}")
-
-async def generate_video(concept: str, video_name: str = "generated_video") -> str:
-    logging.info(f"Generating video for concept: {concept}")
-    outline = create_video_outline(concept)
-    logging.info(f"Video outline created: {outline}")
+# The event loop only keeps weak references to tasks, so fire-and-forget ones are held here until they finish.
+background_tasks = set()
 
-    video_files = []
-    for i, chapter in enumerate(outline.chapters):
-        logging.info(f"Processing chapter {i + 1}: {chapter.title}")
-        manim_code = create_manim_code(chapter)
-        logging.debug(f"Generated Manim code for chapter {i + 1}: {manim_code}")
-
-        success = False
+async def prewarm_llm_cache(topics: List[str]):
+    for topic in topics:
+        try:
+            outline = await create_video_outline(topic)
+            await asyncio.gather(*(create_manim_code(chapter) for chapter in outline.chapters))
+            logging.info(f"Pre-warmed LLM cache for: {topic}")
+        except Exception as e:
+            logging.error(f"Error pre-warming LLM cache for {topic}: {e}")
+
+async def render_scene(code: str, chapter_num: int, work_dir: str, quality: str = DEFAULT_QUALITY, fps: Optional[int] = None, duration: Optional[float] = None) -> str:
+    with span("manim.render", quality=quality, fps=fps, warm_worker=WARM_WORKERS_ENABLED) as current:
+        key = render_cache.key(code, f"{quality}@{fps}" if fps else quality)
+        cached = render_cache.get(key, os.path.join(work_dir, f"cached_{key[:12]}.mp4"))
+        current.set(cache_hit=bool(cached))
+        if cached:
+            return cached
+        # The first validation imports Manim for its symbol table, which takes seconds; keep it off the event loop.
+        scene_name = await asyncio.to_thread(validate_manim_code, code)
+        timeout = render_timeout(quality, fps, duration)
+        if WARM_WORKERS_ENABLED:
+            render = warm_pool.submit(code, scene_name, chapter_num, work_dir, quality, fps, timeout)
+        else:
+            render = get_render_pool().submit(render_manim_scene, code, scene_name, chapter_num, work_dir, quality, fps, timeout)
+        video_file = await asyncio.wrap_future(render)
+        await asyncio.to_thread(render_cache.put, key, video_file)
+        return video_file
+
+async def render_chapter(job: Job, chapter_num: int, manim_code: str, work_dir: str, quality: str = DEFAULT_QUALITY, fps: Optional[int] = None, duration: Optional[float] = None, source: Optional[Tuple[CachedAgent, str]] = None) -> Optional[Tuple[int, str, str]]:
+    """Render a chapter, fixing its code between attempts; source is the cached agent and prompt the code came from."""
+    with span("chapter", chapter=chapter_num, quality=quality):
         attempts = 0
         max_attempts = 2
-
-        while attempts < max_attempts and not success:
+        autofixes = 0
+        last_fix: Optional[Fix] = None
+
+        async def repair(error: str, code: str) -> str:
+            nonlocal attempts, autofixes, last_fix
+            if last_fix is not None:
+                autofixer.record_failure(last_fix, error)
+            job.update_chapter(chapter_num, status="fixing", error=error[-MAX_ERROR_CHARS:])
+            last_fix = await fix_manim_code(error, code, allow_autofix=autofixes < MAX_AUTOFIXES)
+            if last_fix.source != "llm":
+                # Deterministic patches cost milliseconds, so they don't use up the LLM fixer's attempts.
+                autofixes += 1
+                attempts -= 1
+            logging.debug(f"Fixed Manim code ({last_fix.source}, attempt {attempts}): {last_fix.code}")
+            return last_fix.code
+
+        while attempts < max_attempts:
+            job.update_chapter(chapter_num, status="rendering", attempts=attempts + 1)
+            attempt_started = time.time()
+            partials_before = len(partial_movie_files(work_dir))
             try:
-                video_file = render_manim_scene(manim_code, i + 1)
-                video_files.append(video_file)
-                logging.info(f"Video file created for chapter {i + 1}: {video_file}")
-                success = True
+                with span("chapter.attempt", attempt=attempts + 1):
+                    video_file = await render_scene(manim_code, chapter_num, work_dir, quality, fps, duration)
+                logging.info(f"Video file created for chapter {chapter_num}: {video_file}")
+                if last_fix is not None:
+                    autofixer.record_success(last_fix)
+                job.update_chapter(chapter_num, status="done", error=None)
+                return chapter_num, video_file, manim_code
+            except ManimCodeError as e:
+                attempts += 1
+                logging.error(f"Manim code failed validation for chapter {chapter_num} (Attempt {attempts}): {e}")
+                manim_code = await repair(str(e), manim_code)
             except subprocess.CalledProcessError as e:
                 attempts += 1
-                logging.error(f"Manim execution failed for chapter {i + 1} (Attempt {attempts}): {e}")
+                discard_incomplete_partial(work_dir, attempt_started)
+                logging.error(f"Manim execution failed for chapter {chapter_num} (Attempt {attempts}): {e}")
                 logging.info("Attempting to fix the code...")
-                manim_code = debug_manim_code(str(e), manim_code)
-                logging.debug(f"Fixed Manim code (Attempt {attempts}): {manim_code}")
+                # The traceback is what identifies the failure; the exit status alone says nothing.
+                manim_code = await repair((e.stderr or "").strip()[-MAX_ERROR_CHARS:] or str(e), manim_code)
             except ValueError as e:
-                logging.error(f"Error processing Manim code for chapter {i + 1}: {e}")
-                raise HTTPException(status_code=500, detail=f"Error processing chapter {i + 1}: {e}")
+                logging.error(f"Error processing Manim code for chapter {chapter_num}: {e}")
+                raise HTTPException(status_code=500, detail=f"Error processing chapter {chapter_num}: {e}")
             except FileNotFoundError:
                 logging.error("Manim not found. Please ensure it's installed and in your PATH.")
                 raise HTTPException(status_code=500, detail="Manim not found. Please ensure it's installed and in your PATH.")
             except subprocess.TimeoutExpired:
-                logging.error(f"Manim process timed out for chapter {i + 1}. Attempting to fix...")
-                manim_code = debug_manim_code("Manim process timed out.", manim_code)
-                logging.debug(f"Fixed Manim code (Attempt {attempts}): {manim_code}")
+                attempts += 1
+                discard_incomplete_partial(work_dir, attempt_started)
+                resumable = len(partial_movie_files(work_dir)) - partials_before
+                if resumable > 0 and attempts < max_attempts:
+                    # The code was making progress, so rerun it unchanged and let Manim skip the animations it already wrote.
+                    logging.info(f"Manim timed out for chapter {chapter_num} after {resumable} animations, resuming from partial movie files")
+                    job.update_chapter(chapter_num, status="resuming", error="Manim process timed out.")
+                    continue
+                logging.error(f"Manim process timed out for chapter {chapter_num}. Attempting to fix...")
+                manim_code = await repair("Manim process timed out.", manim_code)
+
+        logging.error(f"Failed to generate video for chapter {chapter_num} after {max_attempts} attempts. Skipping chapter.")
+        job.update_chapter(chapter_num, status="failed")
+        if source is not None:
+            # Otherwise the next identical prompt replays the same broken code straight into the fixer loop.
+            agent, prompt = source
+            await agent.invalidate(prompt)
+        return None
+
+async def concatenate_chapter_videos(job: Job, video_files: List[str], output_path: str, job_dir: str):
+    logging.info("Combining video files...")
+    try:
+        with span("ffmpeg.concat", chapters=len(video_files)) as current:
+            concat_method = await asyncio.to_thread(concatenate_videos, video_files, output_path, job_dir)
+            current.set(method=concat_method)
+        job.update(concat_method=concat_method)
+        logging.info(f"Video created ({concat_method}): {output_path}")
+    except Exception as e:
+        logging.error(f"Error combining video files: {e}")
+        raise HTTPException(status_code=500, detail=f"Error combining video files: {e}")
+
+async def publish_video(job: Job, video_files: List[str], name: str, kind: str, job_dir: str) -> MediaEntry:
+    staged_path = os.path.join(job_dir, f"{name}.mp4")
+    await concatenate_chapter_videos(job, video_files, staged_path, job_dir)
+    with span("media.publish", kind=kind):
+        entry = await asyncio.to_thread(media_store.publish, staged_path, name, kind, job.job_id)
+    logging.info(f"Published {kind} video {name} ({entry.size} bytes)")
+    return entry
+
+async def generate_video(concept: str, video_name: str = "generated_video", job: Optional[Job] = None, quality: str = DEFAULT_QUALITY, fps: Optional[int] = None, draft: bool = False, codegen_mode: CodegenMode = CODEGEN_MODE, output_format: OutputFormat = OUTPUT_FORMAT) -> str:
+    job = job or Job(concept, video_name, quality=quality, fps=fps, draft=draft, codegen_mode=codegen_mode, output_format=output_format)
+    media_store.path(video_name)
+    # A draft pass only pays off when the requested render is more expensive than the draft itself.
+    draft = draft and (quality != DRAFT_QUALITY or fps is not None)
+    first_quality, first_fps = (DRAFT_QUALITY, None) if draft else (quality, fps)
+    logging.info(f"Generating video for concept: {concept}")
+    job.update(stage="outline")
+    with span("stage.outline", codegen_mode=codegen_mode):
+        outline = await (create_video_script(concept) if codegen_mode == "batch" else create_video_outline(concept))
+    logging.info(f"Video outline created: {outline}")
+    job.set_chapters([chapter.title for chapter in outline.chapters])
+
+    job_dir = os.path.join(WORK_ROOT, job.job_id)
+    chapter_tasks = {}
+    loop = asyncio.get_running_loop()
+
+    def chapter_streamed(chapter_num: int):
+        job.update(playlist_url=f"/hls/{video_name}/{job.job_id}/{MASTER_PLAYLIST}", streamed_chapters=hls_writer.appended)
+        logging.info(f"Chapter {chapter_num} is streaming")
+
+    def start_hls(order: List[int]) -> HLSWriter:
+        return HLSWriter(media_store.hls_dir(video_name, job.job_id), order, on_append=lambda chapter_num: loop.call_soon_threadsafe(chapter_streamed, chapter_num))
+
+    # In HLS mode the stream starts with the first pass unless that pass is only a draft.
+    hls_writer = start_hls(list(range(1, len(outline.chapters) + 1))) if output_format == "hls" and not draft else None
+    stream_registered = False
+
+    async def render_and_stream(chapter_num: int, render) -> Optional[Tuple[int, str, str]]:
+        rendered_chapter = await render
+        if hls_writer:
+            with span("hls.segment", chapter=chapter_num):
+                await asyncio.to_thread(hls_writer.add, chapter_num, rendered_chapter[1] if rendered_chapter else None)
+        return rendered_chapter
+
+    def code_source(chapter_num: int) -> Tuple[CachedAgent, str]:
+        return (cached_batch_agent, concept) if codegen_mode == "batch" else (cached_manim_agent, manim_prompt(outline.chapters[chapter_num - 1]))
+
+    def start_render(chapter_num: int, manim_code: str):
+        if job.state.first_render_at is None:
+            job.update(first_render_at=time.time())
+        work_dir = os.path.join(job_dir, f"chapter{chapter_num}")
+        duration = outline.chapters[chapter_num - 1].duration_seconds
+        chapter_tasks[chapter_num] = asyncio.ensure_future(render_and_stream(chapter_num, render_chapter(job, chapter_num, manim_code, work_dir, first_quality, first_fps, duration, code_source(chapter_num))))
+
+    async def generate_and_render(chapter_num: int, chapter: ChapterDescription):
+        logging.info(f"Processing chapter {chapter_num}: {chapter.title}")
+        job.update_chapter(chapter_num, status="generating")
+        with span("stage.codegen", chapter=chapter_num):
+            manim_code = await create_manim_code(chapter)
+        logging.debug(f"Generated Manim code for chapter {chapter_num}: {manim_code}")
+        # Each chapter starts rendering as soon as its own code is back.
+        start_render(chapter_num, manim_code)
 
-        if not success:
-            logging.error(f"Failed to generate video for chapter {i + 1} after {max_attempts} attempts. Skipping chapter.")
-            continue
+    try:
+        job.update(stage="codegen")
+        if codegen_mode == "batch":
+            for i, chapter in enumerate(outline.chapters):
+                start_render(i + 1, chapter.code)
+        elif codegen_mode == "concurrent":
+            await asyncio.gather(*(generate_and_render(i + 1, chapter) for i, chapter in enumerate(outline.chapters)))
+        else:
+            for i, chapter in enumerate(outline.chapters):
+                await generate_and_render(i + 1, chapter)
+
+        job.update(stage="rendering")
+        rendered = [chapter for chapter in await asyncio.gather(*(chapter_tasks[number] for number in sorted(chapter_tasks))) if chapter]
+        if not rendered:
+            logging.warning("No video files to combine.")
+            raise HTTPException(status_code=500, detail="No video files were generated.")
+
+        if draft:
+            job.update(stage="previewing")
+            preview_name = f"{video_name}_preview"
+            await publish_video(job, [video_file for _, video_file, _ in rendered], preview_name, "preview", job_dir)
+            job.update(stage="finalizing", preview_url=f"/download/{preview_name}")
+            logging.info(f"Draft preview ready, re-rendering {len(rendered)} chapters at quality {quality}")
+
+            if output_format == "hls":
+                hls_writer = start_hls([chapter_num for chapter_num, _, _ in rendered])
+            chapter_tasks = {
+                chapter_num: asyncio.ensure_future(render_and_stream(chapter_num, render_chapter(job, chapter_num, manim_code, os.path.join(job_dir, f"chapter{chapter_num}"), quality, fps, outline.chapters[chapter_num - 1].duration_seconds, code_source(chapter_num))))
+                for chapter_num, _, manim_code in rendered
+            }
+            rendered = [chapter for chapter in await asyncio.gather(*chapter_tasks.values()) if chapter]
+            if not rendered:
+                raise HTTPException(status_code=500, detail="No chapters survived the final render.")
+
+        if hls_writer:
+            if not hls_writer.appended:
+                raise HTTPException(status_code=500, detail="No chapters could be segmented for HLS.")
+            final_video_path = await asyncio.to_thread(hls_writer.finish)
+            await asyncio.to_thread(media_store.register_stream, video_name, final_video_path, hls_writer.total_bytes(), job.job_id)
+            stream_registered = True
+            logging.info(f"Final playlist written: {final_video_path}")
+        else:
+            job.update(stage="concatenating")
+            await publish_video(job, [video_file for _, video_file, _ in rendered], video_name, "final", job_dir)
+            final_video_path = media_store.path(video_name)
+            logging.info(f"Final video created: {final_video_path}")
+    finally:
+        for task in chapter_tasks.values():
+            task.cancel()
+        if hls_writer and not stream_registered:
+            shutil.rmtree(hls_writer.output_dir, ignore_errors=True)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        logging.info(f"Deleted job work directory: {job_dir}")
 
-    final_video_path = None
-    if video_files:
-        logging.info("Combining video files...")
-        try:
-            clips = [VideoFileClip(f"./media/videos/temp/480p15/{video_file}") for video_file in video_files]
-            final_video_path = f"{video_name}.mp4"
-            final_clip = concatenate_videoclips(clips)
-            final_clip.write_videofile(final_video_path, codec="libx264", audio_codec="aac")
-            final_clip.close()
+    return final_video_path
 
-            logging.info(f"Final video created: {final_video_path}")
+job_manager = JobManager(lambda job: generate_video(job.state.prompt, job.state.video_name, job, job.state.quality, job.state.fps, job.state.draft, job.state.codegen_mode, job.state.output_format))
 
-            for video_file in video_files:
-                try:
-                    os.remove(video_file)
-                    logging.info(f"Deleted intermediate video file: {video_file}")
-                except Exception as e:
-                    logging.error(f"Error deleting intermediate video file {video_file}: {e}")
-        except Exception as e:
-            logging.error(f"Error combining video files: {e}")
-            raise HTTPException(status_code=500, detail=f"Error combining video files: {e}")
-    else:
-        logging.warning("No video files to combine.")
-        raise HTTPException(status_code=500, detail="No video files were generated.")
+@app.on_event("startup")
+async def warm_manim_exports():
+    # Load Manim's symbol table in the background so the first chapter doesn't pay for the import.
+    asyncio.get_running_loop().run_in_executor(None, manim_exports)
 
-    return final_video_path
+@app.on_event("shutdown")
+async def shutdown_render_workers():
+    warm_pool.shutdown()
 
 @app.get("/", response_model=HealthResponse)
 async def root():
@@ -256,42 +506,98 @@ async def health_check():
         message="API is operational"
     )
 
-@app.post("/generate-video", response_model=VideoResponse)
+@app.post("/generate-video", response_model=JobSubmitResponse, status_code=202)
 async def create_video(request: VideoRequest):
+    logging.info(f"Received video generation request: {request.prompt}")
     try:
-        logging.info(f"Received video generation request: {request.prompt}")
-        
-        video_path = await generate_video(request.prompt, request.video_name)
-        
-        return VideoResponse(
-            message="Video generated successfully",
-            video_path=video_path,
-            status="completed"
-        ) if os.path.exists(video_path) else HTTPException(status_code=500, detail="Video file was not created")
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        logging.error(f"Unexpected error during video generation: {e}")
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+        media_store.path(request.video_name)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    job = job_manager.submit(request.prompt, request.video_name, quality=request.quality, fps=request.fps, draft=request.draft, codegen_mode=request.codegen_mode, output_format=request.output_format)
+    return JobSubmitResponse(
+        message="Video generation queued",
+        job_id=job.job_id,
+        status=job.state.stage,
+        status_url=f"/jobs/{job.job_id}",
+        events_url=f"/jobs/{job.job_id}/events"
+    )
 
-@app.get("/download/{video_name}")
-async def download_video(video_name: str):
-    video_path = f"{video_name}.mp4"
-    
-    if not os.path.exists(video_path):
-        raise HTTPException(status_code=404, detail="Video file not found")
-    
-    return FileResponse(
-        path=video_path,
-        media_type="video/mp4",
-        filename=video_path
+@app.get("/jobs/{job_id}", response_model=JobState)
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.state
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(job.events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "render": render_cache.stats(),
+        "llm": {agent.name: agent.stats() for agent in (cached_outline_agent, cached_manim_agent, cached_code_fixer_agent, cached_batch_agent)},
+        "autofix": autofixer.stats(),
+    }
+
+@app.post("/cache/prewarm", status_code=202)
+async def prewarm_cache(request: PrewarmRequest):
+    task = asyncio.create_task(prewarm_llm_cache(request.topics))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return {"message": "LLM cache pre-warm started", "topics": request.topics}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Per-stage latency histograms, cache lookups and provider limits in the Prometheus text format"""
+    return metrics.render() + render_provider_metrics() + (
+        "# HELP manim_jobs_queued Video jobs waiting for a worker.\n"
+        "# TYPE manim_jobs_queued gauge\n"
+        f"manim_jobs_queued {job_manager.queue_size()}\n"
     )
 
+@app.api_route("/download/{video_name}", methods=["GET", "HEAD"])
+async def download_video(video_name: str, request: Request):
+    entry = media_store.get(video_name)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Video file not found")
+    if entry.kind == "hls":
+        return RedirectResponse(f"/hls/{entry.filename}", status_code=307)
+    return MediaFileResponse(media_store.path(video_name), entry, request.headers, request.method)
+
+@app.get("/hls/{video_name}/{file_path:path}")
+async def stream_video(video_name: str, file_path: str):
+    """Master and media playlists, live while the job runs, and their segments"""
+    try:
+        hls_dir = os.path.realpath(media_store.hls_dir(video_name))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    path = os.path.realpath(os.path.join(hls_dir, file_path))
+    if not path.startswith(hls_dir + os.sep) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Stream not found")
+    if path.endswith(".m3u8"):
+        # Playlists change until EXT-X-ENDLIST is written, so players must always revalidate them.
+        with open(path, encoding="utf-8") as f:
+            return Response(f.read(), media_type="application/vnd.apple.mpegurl", headers={"Cache-Control": "no-cache"})
+    if not path.endswith(".ts"):
+        raise HTTPException(status_code=404, detail="Stream not found")
+    # A segment is never rewritten once a playlist lists it.
+    return FileResponse(path, media_type="video/mp2t", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
 @app.get("/videos")
-async def list_videos():
-    videos = [file for file in os.listdir(".") if file.endswith(".mp4") and file != "final.mp4"]
-    return {"videos": videos}
+async def list_videos(offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500), kind: Optional[str] = Query(None, description="final, preview or hls")):
+    entries, total = media_store.list(offset, limit, kind)
+    next_offset = offset + len(entries)
+    return {
+        "videos": [entry.filename for entry in entries],
+        "items": entries,
+        "total": total,
+        "next_offset": next_offset if next_offset < total else None,
+    }
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""Benchmark generate_video end to end with stub LLMs, so no Gemini key or network is needed.
+
+The outline, codegen and batch agents are overridden with FunctionModels that return short, valid scenes after a
+simulated latency; Manim and ffmpeg run for real. Every configuration runs in a fresh interpreter so CPU time and
+peak RSS are its own.
+
+    python -m benchmarks.pipeline_benchmark --chapters 1 3 10 --concurrency 1 4 --workers warm cold
+    python -m benchmarks.pipeline_benchmark --codegen-modes sequential concurrent batch --llm-overhead 1 --llm-chapter-seconds 3
+    python -m benchmarks.pipeline_benchmark --json results.json
+    python -m benchmarks.pipeline_benchmark --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGRESSION_THRESHOLD = 1.2
+CONCEPT = "The Pythagorean theorem"
+
+def child_environment(workers: str, concurrency: int, scratch_dir: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "MANIM_LLM_MODEL": "test",
+        "MANIM_LLM_CACHE": "none",
+        "MANIM_RENDER_WORKERS": str(concurrency),
+        "MANIM_WARM_WORKERS": "1" if workers == "warm" else "0",
+        "MANIM_RENDER_CACHE_DIR": os.path.join(scratch_dir, "render_cache"),
+        "MANIM_WORK_DIR": os.path.join(scratch_dir, "jobs"),
+        "MANIM_MEDIA_DIR": os.path.join(scratch_dir, "media"),
+        "MANIM_FIX_STORE": os.path.join(scratch_dir, "fix_store.sqlite3"),
+        "MANIM_TRACE_FILE": "",
+    }
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def run_single(chapter_count: int, quality: str, codegen_mode: str, llm_overhead: float, llm_chapter_seconds: float):
+    """Runs inside the child interpreter; prints one JSON line with the measurements."""
+    import app
+    from benchmarks.stubs import batch_model, manim_model, outline_model
+    from utils.jobs import Job
+    from utils.tracing import metrics
+
+    metrics.reset()
+    video_name = "bench"
+    job = Job(CONCEPT, video_name, quality=quality, codegen_mode=codegen_mode)
+    started_at = time.time()
+    cpu_start, wall_start = cpu_seconds(), time.perf_counter()
+    try:
+        with app.outline_agent.override(model=outline_model(chapter_count, llm_overhead, llm_chapter_seconds)), \
+                app.manim_agent.override(model=manim_model(llm_overhead, llm_chapter_seconds)), \
+                app.batch_agent.override(model=batch_model(chapter_count, llm_overhead, llm_chapter_seconds)):
+            output = asyncio.run(app.generate_video(CONCEPT, video_name, job, quality=quality, codegen_mode=codegen_mode))
+    finally:
+        # Warm workers are reaped here, so their CPU time lands in RUSAGE_CHILDREN before it is read.
+        app.warm_pool.shutdown()
+    wall = time.perf_counter() - wall_start
+    cpu = cpu_seconds() - cpu_start
+
+    print(json.dumps({
+        "wall_seconds": round(wall, 3),
+        "first_render_seconds": round(job.state.first_render_at - started_at, 3) if job.state.first_render_at else None,
+        "cpu_seconds": round(cpu, 3),
+        # ru_maxrss is in kilobytes on Linux; the children figure is the largest single render worker or ffmpeg.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        "output_bytes": os.path.getsize(output) if os.path.exists(output) else 0,
+        "stages": {name: {"seconds": round(seconds, 3), "count": count} for name, (seconds, count) in sorted(metrics.snapshot().items())},
+    }))
+
+def run_configuration(workers: str, codegen_mode: str, chapter_count: int, concurrency: int, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        completed = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.pipeline_benchmark", "--single", "--chapters", str(chapter_count),
+                "--quality", args.quality, "--codegen-modes", codegen_mode, "--llm-overhead", str(args.llm_overhead),
+                "--llm-chapter-seconds", str(args.llm_chapter_seconds)
+            ],
+            cwd=BACKEND_DIR, env=child_environment(workers, concurrency, scratch_dir), capture_output=True, text=True
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{workers} {codegen_mode} chapters={chapter_count} concurrency={concurrency} failed:\n{completed.stderr[-4000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {"workers": workers, "codegen_mode": codegen_mode, "chapters": chapter_count, "concurrency": concurrency, "quality": args.quality, **result}
+
+def configuration_key(result: dict) -> tuple:
+    return result["workers"], result["codegen_mode"], result["chapters"], result["concurrency"], result["quality"]
+
+def print_result(result: dict, baseline: Optional[dict] = None):
+    top_stages = sorted(result["stages"].items(), key=lambda item: -item[1]["seconds"])[:4]
+    first_render = result["first_render_seconds"]
+    line = (f"{result['workers']:<5} {result['codegen_mode']:<10} chapters={result['chapters']:<3} concurrency={result['concurrency']:<3} "
+            f"first_render={first_render if first_render is not None else float('nan'):6.2f}s wall={result['wall_seconds']:7.2f}s cpu={result['cpu_seconds']:7.2f}s "
+            f"rss={result['peak_rss_mb']:6.1f}MB child_rss={result['peak_child_rss_mb']:6.1f}MB")
+    if baseline:
+        line += f" vs_baseline={result['wall_seconds'] / baseline['wall_seconds']:5.2f}x"
+    print(line)
+    print("    " + "  ".join(f"{name}={stage['seconds']:.2f}s/{stage['count']}" for name, stage in top_stages))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chapters", type=int, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="Render worker counts to try.")
+    parser.add_argument("--workers", nargs="+", choices=["warm", "cold"], default=["warm", "cold"])
+    parser.add_argument("--codegen-modes", nargs="+", choices=["sequential", "concurrent", "batch"], default=["sequential", "concurrent", "batch"])
+    parser.add_argument("--quality", choices=["l", "m", "h", "k"], default="l")
+    parser.add_argument("--llm-overhead", type=float, default=0.5, help="Simulated seconds of latency per LLM call.")
+    parser.add_argument("--llm-chapter-seconds", type=float, default=1.5, help="Simulated seconds to generate one chapter's code.")
+    parser.add_argument("--json", help="Write all results to this file.")
+    parser.add_argument("--compare", help="Results file from an earlier run; exit non-zero when a configuration got slower.")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args.chapters[0], args.quality, args.codegen_modes[0], args.llm_overhead, args.llm_chapter_seconds)
+        return
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {configuration_key(result): result for result in json.load(f)}
+
+    results = []
+    for workers in args.workers:
+        for codegen_mode in args.codegen_modes:
+            for chapter_count in args.chapters:
+                for concurrency in args.concurrency:
+                    result = run_configuration(workers, codegen_mode, chapter_count, concurrency, args)
+                    print_result(result, baseline.get(configuration_key(result)))
+                    results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    regressions = [
+        result for result in results
+        if configuration_key(result) in baseline
+        and result["wall_seconds"] > baseline[configuration_key(result)]["wall_seconds"] * REGRESSION_THRESHOLD
+    ]
+    if regressions:
+        print(f"{len(regressions)} configuration(s) are more than {REGRESSION_THRESHOLD:.1f}x slower than the baseline")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
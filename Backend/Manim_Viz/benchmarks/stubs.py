@@ -0,0 +1,81 @@
+"""Deterministic stand-ins for the outline, codegen and batch LLMs, so benchmarks run offline and repeatably.
+
+Each stub sleeps for a simulated latency of a fixed per-call overhead plus generation time proportional to its
+output, so the codegen modes can be compared on round-trips without a real model.
+"""
+import asyncio
+import json
+import re
+from typing import List
+
+from pydantic_ai.messages import ModelMessage, ModelResponse, ToolCallPart, UserPromptPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+CHAPTER_SECONDS = 3
+# Writing one chapter's outline entry takes a fraction of the time of writing its code.
+OUTLINE_SHARE = 0.2
+
+MANIM_TEMPLATE = '''from manim import *
+
+class Chapter{number}(Scene):
+    def construct(self):
+        # Title, a shape and one transform: the usual shape of a generated chapter, just shorter.
+        title = Text({title}).scale(0.6).to_edge(UP)
+        shape = Square(color=BLUE).rotate({number} * PI / 12)
+        self.play(Write(title))
+        self.play(Create(shape))
+        self.play(shape.animate.shift(RIGHT * 2).set_color(YELLOW), run_time={run_time})
+        self.wait(0.5)
+'''
+
+def _last_prompt(messages: List[ModelMessage]) -> str:
+    prompts = [part.content for message in messages for part in message.parts if isinstance(part, UserPromptPart)]
+    return prompts[-1] if prompts else ""
+
+def _result_tool(info: AgentInfo) -> str:
+    return (getattr(info, "output_tools", None) or info.result_tools)[0].name
+
+def _chapter_title(concept: str, number: int) -> str:
+    return f"Chapter {number}: part {number} of {concept}"
+
+def _chapter(concept: str, number: int) -> dict:
+    return {
+        "title": _chapter_title(concept, number),
+        "duration_seconds": CHAPTER_SECONDS,
+        "explanation": f"Write the title, draw a blue square rotated by {number * 15} degrees, then move it right.",
+    }
+
+def chapter_code(number: int, title: str) -> str:
+    return MANIM_TEMPLATE.format(number=number, title=json.dumps(title), run_time=CHAPTER_SECONDS - 2)
+
+def outline_model(chapter_count: int, overhead: float = 0.0, chapter_seconds: float = 0.0) -> FunctionModel:
+    """Answers every concept with an outline of chapter_count short chapters."""
+    async def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(overhead + OUTLINE_SHARE * chapter_seconds * chapter_count)
+        concept = _last_prompt(messages)
+        outline = {"title": concept, "chapters": [_chapter(concept, n) for n in range(1, chapter_count + 1)]}
+        return ModelResponse(parts=[ToolCallPart(tool_name=_result_tool(info), args=outline)])
+    return FunctionModel(respond)
+
+def manim_model(overhead: float = 0.0, chapter_seconds: float = 0.0) -> FunctionModel:
+    """Returns a small valid scene per chapter; chapters get distinct code so the render cache can't collapse them."""
+    async def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(overhead + chapter_seconds)
+        prompt = _last_prompt(messages)
+        match = re.search(r"Chapter (\d+)", prompt)
+        number = int(match.group(1)) if match else 1
+        title = prompt.split(". Visualization:")[0].removeprefix("Title: ")
+        return ModelResponse(parts=[ToolCallPart(tool_name=_result_tool(info), args={"code": chapter_code(number, title)})])
+    return FunctionModel(respond)
+
+def batch_model(chapter_count: int, overhead: float = 0.0, chapter_seconds: float = 0.0) -> FunctionModel:
+    """Answers with the outline and every chapter's code in one response, as the batch codegen mode expects."""
+    async def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(overhead + (1 + OUTLINE_SHARE) * chapter_seconds * chapter_count)
+        concept = _last_prompt(messages)
+        chapters = [
+            {**_chapter(concept, n), "code": chapter_code(n, _chapter_title(concept, n))}
+            for n in range(1, chapter_count + 1)
+        ]
+        return ModelResponse(parts=[ToolCallPart(tool_name=_result_tool(info), args={"title": concept, "chapters": chapters})])
+    return FunctionModel(respond)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Both services import their shared code from Backend/common, whichever directory they were started from.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BACKEND_DIR not in sys.path:
+    sys.path.append(BACKEND_DIR)
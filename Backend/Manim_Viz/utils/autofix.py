@@ -0,0 +1,273 @@
+import ast
+import difflib
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+import tokenize
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.render_cache import normalize_source
+from utils.validation import manim_exports
+
+AUTOFIX_ENABLED = os.environ.get("MANIM_AUTOFIX", "1") == "1"
+FIX_STORE_PATH = os.environ.get("MANIM_FIX_STORE", "fix_store.sqlite3")
+MAX_SIGNATURE_CHARS = 200
+
+EXCEPTION_LINE = re.compile(r"^([A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt))\b")
+QUOTED_NAME = re.compile(r"'([A-Za-z_]\w*)'")
+LATEX_MISSING = re.compile(r"latex (?:error|failed)|no such file or directory: '(?:latex|dvisvgm)'|(?:latex|dvisvgm)\W+(?:command )?not found", re.IGNORECASE)
+
+# Manim Community renames that LLMs trained on 3b1b-era examples still produce.
+RENAMED_APIS = {
+    "ShowCreation": "Create",
+    "TextMobject": "Text",
+    "TexMobject": "MathTex",
+    "get_graph": "plot",
+    "FRAME_WIDTH": "config.frame_width",
+    "FRAME_HEIGHT": "config.frame_height",
+}
+LATEX_CLASSES = {"Tex", "MathTex", "Title"}
+TEX_ONLY_KEYWORDS = {"tex_template", "tex_environment", "substrings_to_isolate", "tex_to_color_map", "arg_separator", "include_underline", "match_underline_width_to_text", "underline_buff"}
+LATEX_SYMBOLS = {
+    r"\alpha": "α", r"\beta": "β", r"\gamma": "γ", r"\delta": "δ", r"\Delta": "Δ", r"\theta": "θ", r"\lambda": "λ",
+    r"\mu": "μ", r"\pi": "π", r"\sigma": "σ", r"\Sigma": "Σ", r"\phi": "φ", r"\omega": "ω", r"\infty": "∞",
+    r"\times": "×", r"\cdot": "·", r"\div": "÷", r"\pm": "±", r"\leq": "≤", r"\geq": "≥", r"\neq": "≠",
+    r"\approx": "≈", r"\rightarrow": "→", r"\to": "→", r"\sqrt": "√", r"\int": "∫", r"\sum": "Σ", r"\partial": "∂",
+}
+SUPERSCRIPTS = str.maketrans("0123456789+-n", "⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻ⁿ")
+
+def error_signature(error: str) -> str:
+    """The final exception line of a traceback with paths, numbers and addresses masked, so repeats of one failure match.
+
+    Quoted identifiers are kept: "NameError: name 'ShowCreation' is not defined" and the same error for another
+    name need different fixes.
+    """
+    lines = [line.strip(" │|\t") for line in error.strip().splitlines()]
+    lines = [line for line in lines if line]
+    message = next((line for line in reversed(lines) if EXCEPTION_LINE.match(line)), lines[-1] if lines else "")
+    message = re.sub(r"(?:[A-Za-z]:)?(?:[\\/][^\s'\"\\/]+)+", "<path>", message)
+    message = re.sub(r"0x[0-9a-fA-F]+", "0x#", message)
+    message = re.sub(r"\b\d+(?:\.\d+)?\b", "#", message)
+    return message[:MAX_SIGNATURE_CHARS]
+
+def rename_names(code: str, renames: Dict[str, str]) -> Optional[str]:
+    """Replace NAME tokens only, so strings and comments that mention a name are left alone."""
+    try:
+        edits = [(token.start, token.end, renames[token.string]) for token in tokenize.generate_tokens(io.StringIO(code).readline) if token.type == tokenize.NAME and token.string in renames]
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return None
+    if not edits:
+        return None
+    lines = code.splitlines(keepends=True)
+    for (row, col), (_, end_col), new in reversed(edits):
+        lines[row - 1] = lines[row - 1][:col] + new + lines[row - 1][end_col:]
+    return "".join(lines)
+
+def add_imports(code: str, import_lines: List[str]) -> Optional[str]:
+    present = {line.strip() for line in code.splitlines()}
+    missing = [line for line in import_lines if line not in present]
+    return "\n".join(missing) + "\n" + code if missing else None
+
+def plain_text(tex: str) -> str:
+    text = re.sub(r"\\frac\{([^{}]*)\}\{([^{}]*)\}", r"(\1)/(\2)", tex)
+    text = re.sub(r"\\(?:text|mathrm|mathbf|textbf|mathit|operatorname)\{([^{}]*)\}", r"\1", text)
+    for command in sorted(LATEX_SYMBOLS, key=len, reverse=True):
+        text = re.sub(re.escape(command) + r"(?![A-Za-z])", LATEX_SYMBOLS[command], text)
+    text = re.sub(r"\^\{?([0-9+\-n]+)\}?", lambda match: match.group(1).translate(SUPERSCRIPTS), text)
+    text = re.sub(r"\\[A-Za-z]+", "", text).replace("\\\\", "\n")
+    return re.sub(r"[ \t]+", " ", text.replace("{", "").replace("}", "").replace("$", "").replace("&", "")).strip()
+
+class _TexToText(ast.NodeTransformer):
+    def __init__(self):
+        self.changed = False
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        if not (isinstance(node.func, ast.Name) and node.func.id in LATEX_CLASSES):
+            return node
+        if node.args and all(isinstance(arg, ast.Constant) and isinstance(arg.value, str) for arg in node.args):
+            text = ast.Constant(plain_text(" ".join(arg.value for arg in node.args)))
+        elif len(node.args) == 1:
+            text = node.args[0]
+        else:
+            return node
+        self.changed = True
+        keywords = [keyword for keyword in node.keywords if keyword.arg not in TEX_ONLY_KEYWORDS]
+        return ast.copy_location(ast.Call(func=ast.Name("Text", ast.Load()), args=[text], keywords=keywords), node)
+
+def fix_missing_manim_import(signature: str, error: str, code: str) -> Optional[str]:
+    match = re.match(r"NameError: name '(\w+)' is not defined", signature)
+    if not match or re.search(r"^\s*from manim import \*", code, re.MULTILINE):
+        return None
+    exports = manim_exports()
+    if exports is not None and match.group(1) not in exports:
+        return None
+    return "from manim import *\n" + code
+
+def fix_renamed_api(signature: str, error: str, code: str) -> Optional[str]:
+    if not signature.startswith(("NameError", "AttributeError", "ImportError")):
+        return None
+    renames = {name: RENAMED_APIS[name] for name in QUOTED_NAME.findall(signature) if name in RENAMED_APIS}
+    return rename_names(code, renames) if renames else None
+
+def fix_missing_latex(signature: str, error: str, code: str) -> Optional[str]:
+    if not LATEX_MISSING.search(error):
+        return None
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    transformer = _TexToText()
+    tree = transformer.visit(tree)
+    return ast.unparse(ast.fix_missing_locations(tree)) if transformer.changed else None
+
+# Tried in order; the first rule that changes the code wins.
+RULES: List[Tuple[str, Callable[[str, str, str], Optional[str]]]] = [
+    ("missing_import", fix_missing_manim_import),
+    ("renamed_api", fix_renamed_api),
+    ("missing_latex", fix_missing_latex),
+]
+
+def _tokens(code: str) -> List[str]:
+    skipped = {tokenize.NL, tokenize.NEWLINE, tokenize.COMMENT, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER}
+    try:
+        return [token.string for token in tokenize.generate_tokens(io.StringIO(code).readline) if token.type not in skipped]
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return []
+
+def _import_lines(code: str) -> List[str]:
+    return [line.strip() for line in code.splitlines() if re.match(r"\s*(?:import|from)\s+\w", line)]
+
+def learn_rules(signature: str, before: str, after: str) -> List[Tuple[str, str, str]]:
+    """Reusable parts of an LLM fix: renames of the names the error quotes, and imports it added for a NameError."""
+    quoted = set(QUOTED_NAME.findall(signature))
+    before_tokens, after_tokens = _tokens(before), _tokens(after)
+    rules = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(a=before_tokens, b=after_tokens, autojunk=False).get_opcodes():
+        if op == "replace" and i2 - i1 == 1 and j2 - j1 == 1 and before_tokens[i1] in quoted and after_tokens[j1].isidentifier():
+            rules.append(("rename", before_tokens[i1], after_tokens[j1]))
+    if signature.startswith(("NameError", "ImportError")):
+        existing = set(_import_lines(before))
+        rules += [("import", line, "") for line in _import_lines(after) if line not in existing]
+    return list(dict.fromkeys(rules))
+
+def apply_rules(code: str, rules: List[Tuple[str, str, str]]) -> Optional[str]:
+    renamed = rename_names(code, {old: new for kind, old, new in rules if kind == "rename"})
+    patched = renamed or code
+    patched = add_imports(patched, [old for kind, old, _ in rules if kind == "import"]) or patched
+    return patched if patched != code else None
+
+class FixStore:
+    """Successful LLM fixes: the exact fixed code per (signature, code), and the rules learned from them per signature."""
+
+    def __init__(self, path: str = FIX_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS fixes (key TEXT PRIMARY KEY, signature TEXT NOT NULL, code TEXT NOT NULL, created_at REAL NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fix_rules (signature TEXT NOT NULL, kind TEXT NOT NULL, old TEXT NOT NULL, new TEXT NOT NULL, "
+            "successes INTEGER NOT NULL DEFAULT 0, failures INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (signature, kind, old, new))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(signature: str, code: str) -> str:
+        return hashlib.sha256(f"{signature}\0{normalize_source(code)}".encode()).hexdigest()
+
+    def get_fix(self, signature: str, code: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT code FROM fixes WHERE key = ?", (self.key(signature, code),)).fetchone()
+        return row[0] if row else None
+
+    def put_fix(self, signature: str, code: str, fixed: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO fixes VALUES (?, ?, ?, ?)", (self.key(signature, code), signature, fixed, time.time()))
+            self._conn.commit()
+
+    def drop_fix(self, signature: str, code: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM fixes WHERE key = ?", (self.key(signature, code),))
+            self._conn.commit()
+
+    def rules(self, signature: str) -> List[Tuple[str, str, str]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, old, new FROM fix_rules WHERE signature = ? AND successes > failures", (signature,)).fetchall()
+        return [tuple(row) for row in rows]
+
+    def add_rules(self, signature: str, rules: List[Tuple[str, str, str]]):
+        with self._lock:
+            for kind, old, new in rules:
+                self._conn.execute("INSERT OR IGNORE INTO fix_rules (signature, kind, old, new) VALUES (?, ?, ?, ?)", (signature, kind, old, new))
+                self._conn.execute("UPDATE fix_rules SET successes = successes + 1 WHERE signature = ? AND kind = ? AND old = ? AND new = ?", (signature, kind, old, new))
+            self._conn.commit()
+
+    def penalize_rules(self, signature: str):
+        with self._lock:
+            self._conn.execute("UPDATE fix_rules SET failures = failures + 1 WHERE signature = ? AND successes > failures", (signature,))
+            self._conn.commit()
+
+@dataclass
+class Fix:
+    signature: str
+    original: str
+    code: str
+    source: str = "llm"
+
+class AutoFixer:
+    """Patches known failures without the LLM: a stored fix for the same code, a deterministic rule, or rules learned from earlier LLM fixes."""
+
+    def __init__(self, store: Optional[FixStore] = None, enabled: bool = AUTOFIX_ENABLED):
+        self.store = store or FixStore()
+        self.enabled = enabled
+        self.counts: Counter = Counter()
+
+    def fix(self, error: str, code: str) -> Optional[Fix]:
+        if not self.enabled:
+            return None
+        signature = error_signature(error)
+        stored = self.store.get_fix(signature, code)
+        if stored and stored != code:
+            return self._found(Fix(signature, code, stored, "stored"))
+        for name, rule in RULES:
+            patched = rule(signature, error, code)
+            if patched and patched != code:
+                return self._found(Fix(signature, code, patched, name))
+        learned = apply_rules(code, self.store.rules(signature))
+        if learned:
+            return self._found(Fix(signature, code, learned, "learned"))
+        return None
+
+    def _found(self, fix: Fix) -> Fix:
+        self.counts[fix.source] += 1
+        logging.info(f"Auto-fixed '{fix.signature}' with {fix.source} fix")
+        return fix
+
+    def record_success(self, fix: Fix):
+        """Called once the fixed code rendered; LLM fixes are remembered for the next time this signature shows up."""
+        self.counts[f"{fix.source}_succeeded"] += 1
+        if fix.source == "llm":
+            self.store.put_fix(fix.signature, fix.original, fix.code)
+            self.store.add_rules(fix.signature, learn_rules(fix.signature, fix.original, fix.code))
+        elif fix.source == "learned":
+            self.store.add_rules(fix.signature, self.store.rules(fix.signature))
+
+    def record_failure(self, fix: Fix, error: str):
+        """Called when the fixed code failed again with the same signature, so a stored or learned fix stops being offered."""
+        if error_signature(error) != fix.signature:
+            return
+        self.counts[f"{fix.source}_failed"] += 1
+        if fix.source == "stored":
+            self.store.drop_fix(fix.signature, fix.original)
+        elif fix.source == "learned":
+            self.store.penalize_rules(fix.signature)
+
+    def stats(self) -> dict:
+        return dict(self.counts)
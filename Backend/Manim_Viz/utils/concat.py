@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import logging
+from typing import List
+
+STREAM_PARAMS = ("codec_type", "codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate", "time_base", "sample_rate", "channels")
+
+def probe_streams(video_path: str) -> List[dict]:
+    command = [
+        "ffprobe", "-v", "error",
+        "-show_entries", f"stream={','.join(STREAM_PARAMS)}",
+        "-of", "json", video_path
+    ]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    streams = json.loads(result.stdout).get("streams", [])
+    return [{key: stream.get(key) for key in STREAM_PARAMS} for stream in streams]
+
+def write_concat_list(video_files: List[str], list_path: str):
+    with open(list_path, "w", encoding="utf-8") as f:
+        for video_file in video_files:
+            escaped = os.path.abspath(video_file).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+def concat_stream_copy(video_files: List[str], output_path: str, work_dir: str):
+    list_path = os.path.join(work_dir, "concat_list.txt")
+    write_concat_list(video_files, list_path)
+    command = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "concat", "-safe", "0",
+        "-i", list_path,
+        "-c", "copy",
+        "-movflags", "+faststart",
+        output_path
+    ]
+    subprocess.run(command, capture_output=True, text=True, check=True)
+
+def concat_reencode(video_files: List[str], output_path: str, streams: List[List[dict]]):
+    video = next(stream for stream in streams[0] if stream["codec_type"] == "video")
+    width, height, fps = video["width"], video["height"], video["r_frame_rate"]
+    with_audio = all(any(stream["codec_type"] == "audio" for stream in file_streams) for file_streams in streams)
+
+    command = ["ffmpeg", "-y", "-v", "error"]
+    filters = []
+    concat_inputs = ""
+    for i, video_file in enumerate(video_files):
+        command += ["-i", video_file]
+        filters.append(
+            f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p[v{i}]"
+        )
+        concat_inputs += f"[v{i}][{i}:a]" if with_audio else f"[v{i}]"
+    filters.append(f"{concat_inputs}concat=n={len(video_files)}:v=1:a={1 if with_audio else 0}[v]" + ("[a]" if with_audio else ""))
+
+    command += ["-filter_complex", ";".join(filters), "-map", "[v]"]
+    command += ["-map", "[a]", "-c:a", "aac"] if with_audio else []
+    command += ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p", "-movflags", "+faststart", output_path]
+    subprocess.run(command, capture_output=True, text=True, check=True)
+
+def concatenate_videos(video_files: List[str], output_path: str, work_dir: str) -> str:
+    streams = [probe_streams(video_file) for video_file in video_files]
+    if all(file_streams == streams[0] for file_streams in streams):
+        try:
+            concat_stream_copy(video_files, output_path, work_dir)
+            logging.info(f"Concatenated {len(video_files)} chapters with stream copy")
+            return "copy"
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Stream copy concatenation failed, re-encoding instead: {e.stderr}")
+    else:
+        logging.info("Chapter stream parameters differ, re-encoding")
+    concat_reencode(video_files, output_path, streams)
+    logging.info(f"Concatenated {len(video_files)} chapters with a single-pass re-encode")
+    return "reencode"
@@ -0,0 +1,19 @@
+import os
+from typing import Callable, List, Optional
+
+from common import hls
+from common.hls import MASTER_PLAYLIST, Rendition, parse_renditions
+
+HLS_SEGMENT_SECONDS = float(os.environ.get("MANIM_HLS_SEGMENT_SECONDS", 4))
+# Comma-separated name:height:video_bitrate[:audio_bitrate], e.g. "720p:720:2800k,480p:480:1200k". Empty keeps one
+# rendition at the rendered chapters' own size.
+HLS_RENDITIONS = os.environ.get("MANIM_HLS_RENDITIONS", "")
+
+class HLSWriter(hls.HLSWriter):
+    """Streams rendered chapters. Manim picks its own keyframe interval, so even the source-size rendition is re-encoded."""
+
+    label = "chapter"
+    copy_source = False
+
+    def __init__(self, output_dir: str, order: List[int], renditions: Optional[List[Rendition]] = None, segment_seconds: float = HLS_SEGMENT_SECONDS, on_append: Optional[Callable[[int], None]] = None):
+        super().__init__(output_dir, order, renditions or parse_renditions(HLS_RENDITIONS), segment_seconds, on_append=on_append)
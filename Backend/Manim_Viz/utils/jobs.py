@@ -0,0 +1,143 @@
+import asyncio
+import os
+import time
+import uuid
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+from utils.tracing import span
+
+MAX_CONCURRENT_JOBS = int(os.environ.get("MANIM_MAX_CONCURRENT_JOBS", 2))
+MAX_FINISHED_JOBS = int(os.environ.get("MANIM_MAX_FINISHED_JOBS", 200))
+HEARTBEAT_SECONDS = 15
+
+TERMINAL_STAGES = ("completed", "failed")
+
+class ChapterState(BaseModel):
+    number: int
+    title: str = ""
+    status: str = Field(default="pending", description="pending, generating, rendering, resuming, fixing, done or failed")
+    attempts: int = 0
+    error: Optional[str] = None
+
+class JobState(BaseModel):
+    job_id: str
+    prompt: str
+    video_name: str
+    quality: str = "l"
+    fps: Optional[int] = None
+    draft: bool = False
+    codegen_mode: str = "sequential"
+    output_format: str = "mp4"
+    stage: str = Field(default="queued", description="queued, outline, codegen, rendering, previewing, finalizing, concatenating, completed or failed")
+    chapters: List[ChapterState] = Field(default_factory=list)
+    video_path: Optional[str] = None
+    preview_url: Optional[str] = Field(default=None, description="Download URL of the low-quality draft, set in draft mode before the final render")
+    playlist_url: Optional[str] = Field(default=None, description="HLS master playlist, set in hls mode once the first chapter is playable")
+    streamed_chapters: int = Field(default=0, description="Chapters appended to the HLS playlist so far")
+    first_render_at: Optional[float] = Field(default=None, description="When the first chapter render started, to compare codegen modes by time to first render")
+    concat_method: Optional[str] = Field(default=None, description="copy when chapters were joined by stream copy, reencode otherwise")
+    error: Optional[str] = None
+    created_at: float = Field(default_factory=time.time)
+    updated_at: float = Field(default_factory=time.time)
+
+class Job:
+    def __init__(self, prompt: str, video_name: str, **settings):
+        self.state = JobState(job_id=uuid.uuid4().hex, prompt=prompt, video_name=video_name, **settings)
+        self._subscribers: List[asyncio.Queue] = []
+
+    @property
+    def job_id(self) -> str:
+        return self.state.job_id
+
+    @property
+    def finished(self) -> bool:
+        return self.state.stage in TERMINAL_STAGES
+
+    def update(self, **fields):
+        for name, value in fields.items():
+            setattr(self.state, name, value)
+        self._publish()
+
+    def set_chapters(self, titles: List[str]):
+        self.update(chapters=[ChapterState(number=i + 1, title=title) for i, title in enumerate(titles)])
+
+    def update_chapter(self, number: int, **fields):
+        chapter = self.state.chapters[number - 1]
+        for name, value in fields.items():
+            setattr(chapter, name, value)
+        self._publish()
+
+    def _publish(self):
+        self.state.updated_at = time.time()
+        snapshot = self.state.model_dump_json()
+        for queue in self._subscribers:
+            queue.put_nowait(snapshot)
+
+    async def events(self):
+        queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            yield f"event: progress\ndata: {self.state.model_dump_json()}\n\n"
+            while not self.finished:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: progress\ndata: {snapshot}\n\n"
+            while not queue.empty():
+                yield f"event: progress\ndata: {queue.get_nowait()}\n\n"
+            yield f"event: done\ndata: {self.state.model_dump_json()}\n\n"
+        finally:
+            self._subscribers.remove(queue)
+
+class JobManager:
+    def __init__(self, runner: Callable[[Job], Awaitable[str]], max_concurrent: int = MAX_CONCURRENT_JOBS):
+        self.runner = runner
+        self.max_concurrent = max_concurrent
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def _start(self):
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrent)]
+        logging.info(f"Started {self.max_concurrent} video job workers")
+
+    def submit(self, prompt: str, video_name: str, **settings) -> Job:
+        if self._queue is None:
+            self._start()
+        job = Job(prompt, video_name, **settings)
+        self.jobs[job.job_id] = job
+        self._queue.put_nowait(job)
+        self._prune()
+        logging.info(f"Queued job {job.job_id} for: {prompt}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.finished]
+        for job in sorted(finished, key=lambda j: j.state.updated_at)[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                with span("job", job_id=job.job_id, quality=job.state.quality, draft=job.state.draft):
+                    video_path = await self.runner(job)
+                job.update(stage="completed", video_path=video_path)
+                logging.info(f"Job {job.job_id} completed: {video_path}")
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                logging.error(f"Job {job.job_id} failed: {detail}")
+                job.update(stage="failed", error=detail)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional, Type
+from pydantic import BaseModel
+from pydantic_ai import Agent
+
+from utils.providers import Provider, estimate_tokens
+from utils.tracing import record_usage, span
+
+LLM_CACHE_BACKEND = os.environ.get("MANIM_LLM_CACHE", "sqlite")
+LLM_CACHE_PATH = os.environ.get("MANIM_LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_TTL = int(os.environ.get("MANIM_LLM_CACHE_TTL", 7 * 24 * 3600))
+LLM_CACHE_MEMORY_ITEMS = int(os.environ.get("MANIM_LLM_CACHE_MEMORY_ITEMS", 512))
+# Up-front guess for the tokens-per-minute budget; the provider settles it against the reported usage.
+EXPECTED_OUTPUT_TOKENS = 1500
+
+class MemoryCache:
+    def __init__(self, max_items: int = LLM_CACHE_MEMORY_ITEMS):
+        self.max_items = max_items
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class SQLiteCache:
+    def __init__(self, path: str = LLM_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: int):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)", (key, value, time.time() + ttl))
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+class TieredCache:
+    def __init__(self, memory: MemoryCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value, LLM_CACHE_TTL)
+        return value
+
+    def set(self, key: str, value: str, ttl: int):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+class NullCache:
+    def get(self, key: str) -> Optional[str]:
+        return None
+
+    def set(self, key: str, value: str, ttl: int):
+        pass
+
+    def delete(self, key: str):
+        pass
+
+def build_llm_cache(backend: str = LLM_CACHE_BACKEND):
+    if backend == "none":
+        return NullCache()
+    if backend == "memory":
+        return TieredCache(MemoryCache())
+    if backend == "sqlite":
+        return TieredCache(MemoryCache(), SQLiteCache())
+    raise ValueError(f"Unknown LLM cache backend: {backend}")
+
+class CachedAgent:
+    def __init__(self, name: str, agent: Agent, system_prompt: str, result_type: Type[BaseModel], cache, ttl: int = LLM_CACHE_TTL, provider: Optional[Provider] = None):
+        self.name = name
+        self.agent = agent
+        self.system_prompt = system_prompt
+        self.result_type = result_type
+        self.cache = cache
+        self.ttl = ttl
+        self.provider = provider
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, prompt: str) -> str:
+        model_name = getattr(self.agent.model, "model_name", str(self.agent.model))
+        payload = "\0".join([self.name, model_name, self.system_prompt, " ".join(prompt.split())])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def run(self, prompt: str) -> BaseModel:
+        with span("llm", agent=self.name) as current:
+            key = self.key(prompt)
+            # The SQLite tier reads from disk, so lookups stay off the event loop.
+            cached = await asyncio.to_thread(self.cache.get, key)
+            current.set(cache_hit=cached is not None)
+            if cached is not None:
+                self.hits += 1
+                logging.info(f"LLM cache hit for {self.name} agent")
+                return self.result_type.model_validate_json(cached)
+            self.misses += 1
+            if self.provider is None:
+                result = await self.agent.run(prompt)
+            else:
+                tokens = estimate_tokens(self.system_prompt + prompt, EXPECTED_OUTPUT_TOKENS)
+                result = await self.provider.call(lambda: self.agent.run(prompt), tokens=tokens)
+            record_usage(current, result)
+            await asyncio.to_thread(self.cache.set, key, result.data.model_dump_json(), self.ttl)
+            return result.data
+
+    async def invalidate(self, prompt: str):
+        """Drop the cached result for prompt, e.g. when the code it produced never rendered."""
+        await asyncio.to_thread(self.cache.delete, self.key(prompt))
+        logging.info(f"Dropped cached {self.name} result")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
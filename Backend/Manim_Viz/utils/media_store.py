@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import sqlite3
+import struct
+import subprocess
+import threading
+import logging
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Mapping, Optional, Tuple
+from pydantic import BaseModel
+from starlette.responses import Response
+
+MEDIA_DIR = os.environ.get("MANIM_MEDIA_DIR", "media_store")
+SEND_CHUNK_BYTES = 256 * 1024
+
+class MediaEntry(BaseModel):
+    name: str
+    kind: str = "final"
+    size: int
+    etag: str
+    modified_at: float
+    job_id: Optional[str] = None
+
+    @property
+    def filename(self) -> str:
+        if self.kind != "hls":
+            return f"{self.name}.mp4"
+        # Every job streams into its own directory, so segments served as immutable are never rewritten.
+        return f"{self.name}/{self.job_id}/master.m3u8" if self.job_id else f"{self.name}/master.m3u8"
+
+def top_level_atoms(path: str) -> List[str]:
+    """Types of the top-level MP4 boxes, in file order, up to and including the first moov or mdat."""
+    atoms = []
+    with open(path, "rb") as f:
+        size_on_disk = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset + 8 <= size_on_disk:
+            f.seek(offset)
+            size, kind = struct.unpack(">I4s", f.read(8))
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+            elif size == 0:
+                size = size_on_disk - offset
+            atoms.append(kind.decode("latin-1"))
+            if kind in (b"moov", b"mdat") or size < 8:
+                break
+            offset += size
+    return atoms
+
+def is_faststart(path: str) -> bool:
+    """A player can start a faststart file from its first bytes, because the moov index comes before the media data."""
+    atoms = top_level_atoms(path)
+    return bool(atoms) and atoms[-1] == "moov"
+
+def remux_faststart(src: str, dst: str):
+    command = [
+        "ffmpeg", "-y", "-v", "error",
+        "-i", src,
+        "-map", "0", "-c", "copy",
+        "-movflags", "+faststart",
+        "-f", "mp4", dst
+    ]
+    subprocess.run(command, capture_output=True, text=True, check=True)
+
+def file_etag(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return f'"{digest.hexdigest()[:32]}"'
+
+class MediaStore:
+    """Published videos live in their own directory and are listed from a SQLite index instead of a directory scan."""
+
+    def __init__(self, root: str = MEDIA_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS media (name TEXT PRIMARY KEY, kind TEXT NOT NULL, size INTEGER NOT NULL, "
+            "etag TEXT NOT NULL, modified_at REAL NOT NULL, job_id TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS media_modified ON media (modified_at)")
+        self._conn.commit()
+
+    def path(self, name: str) -> str:
+        if not name or name in (".", "..") or os.path.basename(name) != name or "\x00" in name:
+            raise ValueError(f"Invalid video name: {name!r}")
+        return os.path.join(self.root, f"{name}.mp4")
+
+    def hls_dir(self, name: str, job_id: Optional[str] = None) -> str:
+        """All streams published under name, or just the one written by job_id."""
+        self.path(name)
+        if job_id is None:
+            return os.path.join(self.root, "hls", name)
+        self.path(job_id)
+        return os.path.join(self.root, "hls", name, job_id)
+
+    def entry_path(self, entry: MediaEntry) -> str:
+        return os.path.join(self.root, "hls", entry.filename) if entry.kind == "hls" else self.path(entry.name)
+
+    def publish(self, src: str, name: str, kind: str = "final", job_id: Optional[str] = None) -> MediaEntry:
+        """Move src into the store as a faststart MP4, replacing any earlier video of the same name atomically."""
+        path = self.path(name)
+        staging = f"{path}.part"
+        if is_faststart(src):
+            shutil.move(src, staging)
+        else:
+            remux_faststart(src, staging)
+            logging.info(f"Moved the moov atom of {name} to the front")
+        os.replace(staging, path)
+        stat = os.stat(path)
+        return self._index(MediaEntry(name=name, kind=kind, size=stat.st_size, etag=file_etag(path), modified_at=stat.st_mtime, job_id=job_id))
+
+    def register_stream(self, name: str, master_path: str, size: int, job_id: Optional[str] = None) -> MediaEntry:
+        """Index a finished HLS stream written under hls_dir(name); size is the total of its segments."""
+        return self._index(MediaEntry(name=name, kind="hls", size=size, etag=file_etag(master_path), modified_at=os.stat(master_path).st_mtime, job_id=job_id))
+
+    def _index(self, entry: MediaEntry) -> MediaEntry:
+        with self._lock:
+            row = self._conn.execute("SELECT name, kind, size, etag, modified_at, job_id FROM media WHERE name = ?", (entry.name,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO media (name, kind, size, etag, modified_at, job_id) VALUES (?, ?, ?, ?, ?, ?)",
+                (entry.name, entry.kind, entry.size, entry.etag, entry.modified_at, entry.job_id)
+            )
+            self._conn.commit()
+        previous = MediaEntry(name=row[0], kind=row[1], size=row[2], etag=row[3], modified_at=row[4], job_id=row[5]) if row else None
+        if previous and previous.kind == "hls" and previous.job_id and self.entry_path(previous) != self.entry_path(entry):
+            # Only now that the index points at the new video can the stream it replaced go.
+            shutil.rmtree(os.path.dirname(self.entry_path(previous)), ignore_errors=True)
+            logging.info(f"Removed the replaced stream of {entry.name}")
+        return entry
+
+    def get(self, name: str) -> Optional[MediaEntry]:
+        with self._lock:
+            row = self._conn.execute("SELECT name, kind, size, etag, modified_at, job_id FROM media WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        entry = MediaEntry(name=row[0], kind=row[1], size=row[2], etag=row[3], modified_at=row[4], job_id=row[5])
+        if not os.path.exists(self.entry_path(entry)):
+            logging.warning(f"Dropping index entry for missing video {name}")
+            self.forget(name)
+            return None
+        return entry
+
+    def forget(self, name: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM media WHERE name = ?", (name,))
+            self._conn.commit()
+
+    def list(self, offset: int = 0, limit: int = 50, kind: Optional[str] = None) -> Tuple[List[MediaEntry], int]:
+        """Newest first."""
+        where, params = ("WHERE kind = ?", (kind,)) if kind else ("", ())
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM media {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT name, kind, size, etag, modified_at, job_id FROM media {where} ORDER BY modified_at DESC, name LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+        entries = [MediaEntry(name=row[0], kind=row[1], size=row[2], etag=row[3], modified_at=row[4], job_id=row[5]) for row in rows]
+        return entries, total
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _not_modified_since(header: str, modified_at: float) -> bool:
+    try:
+        return int(modified_at) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive byte range of a single-range header, (-1, -1) when it can't be satisfied, None to ignore it and send everything."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Multipart byteranges aren't worth it for video; RFC 9110 lets us answer with the full body instead.
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first.isdigit() or last.isdigit()) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        suffix = int(last)
+        return (max(0, size - suffix), size - 1) if suffix and size else (-1, -1)
+    start, end = int(first), int(last) if last else size - 1
+    if start >= size:
+        return (-1, -1)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+class MediaFileResponse(Response):
+    """Serves a published video with conditional GET and single byte ranges.
+
+    The body goes out through the server's zero-copy extension (sendfile) when it offers one, and as pread chunks from
+    a worker thread otherwise, so a seek in the player only ever reads the bytes it asked for.
+    """
+
+    def __init__(self, path: str, entry: MediaEntry, request_headers: Mapping[str, str], method: str = "GET", media_type: str = "video/mp4"):
+        self.path = path
+        self.background = None
+        self.media_type = media_type
+        self.send_body = method != "HEAD"
+        self.byte_range: Optional[Tuple[int, int]] = (0, entry.size - 1)
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": entry.etag,
+            "last-modified": formatdate(entry.modified_at, usegmt=True),
+            "content-disposition": f'attachment; filename="{entry.filename}"',
+        }
+        if_none_match = request_headers.get("if-none-match")
+        if_modified_since = request_headers.get("if-modified-since")
+        if (if_none_match and _etag_matches(if_none_match, entry.etag)) or (not if_none_match and if_modified_since and _not_modified_since(if_modified_since, entry.modified_at)):
+            self.status_code, self.byte_range = 304, None
+            self.init_headers(headers)
+            return
+
+        self.status_code = 200
+        requested = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        # A stale If-Range means the client's partial copy is of an older file, so it gets the whole new one.
+        if requested and (not if_range or if_range == entry.etag or if_range == headers["last-modified"]):
+            byte_range = parse_range(requested, entry.size)
+            if byte_range == (-1, -1):
+                self.status_code, self.byte_range = 416, None
+                headers["content-range"] = f"bytes */{entry.size}"
+                headers["content-length"] = "0"
+            elif byte_range:
+                self.status_code, self.byte_range = 206, byte_range
+                headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{entry.size}"
+        if self.byte_range:
+            headers["content-length"] = str(self.byte_range[1] - self.byte_range[0] + 1)
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or not self.byte_range or self.byte_range[1] < self.byte_range[0]:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        start, end = self.byte_range
+        extensions = scope.get("extensions") or {}
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in extensions:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": start, "count": end - start + 1})
+                return
+            offset = start
+            while offset <= end:
+                chunk = await asyncio.to_thread(os.pread, f.fileno(), min(SEND_CHUNK_BYTES, end - offset + 1), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": offset <= end})
+        if offset <= end:
+            # The file shrank underneath us; end the response rather than leave the client waiting.
+            await send({"type": "http.response.body", "body": b""})
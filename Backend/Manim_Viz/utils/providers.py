@@ -0,0 +1,12 @@
+"""Provider limits for the Gemini calls of the outline, codegen and fixer agents; the budget itself is common/providers.py."""
+from common.providers import Provider, ProviderRegistry, estimate_tokens
+
+# name: (requests/min, tokens/min, initial concurrency, max concurrency, hedge); 0 means unlimited.
+PROVIDER_DEFAULTS = {
+    "gemini": (1000, 1_000_000, 4, 16, False),
+}
+
+providers = ProviderRegistry(PROVIDER_DEFAULTS)
+get_provider = providers.get
+provider_stats = providers.stats
+render_provider_metrics = providers.render_metrics
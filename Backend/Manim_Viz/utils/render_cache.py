@@ -0,0 +1,115 @@
+import ast
+import hashlib
+import os
+import shutil
+import threading
+import logging
+from collections import OrderedDict
+from importlib import metadata
+from typing import Optional
+
+RENDER_CACHE_DIR = os.environ.get("MANIM_RENDER_CACHE_DIR", "render_cache")
+RENDER_CACHE_MAX_MB = int(os.environ.get("MANIM_RENDER_CACHE_MAX_MB", 2048))
+
+def manim_version() -> str:
+    try:
+        return metadata.version("manim")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+def normalize_source(code: str) -> str:
+    # Unparsing the AST drops comments, blank lines and formatting differences between LLM responses.
+    try:
+        return ast.unparse(ast.parse(code))
+    except SyntaxError:
+        return "\n".join(line.rstrip() for line in code.strip().splitlines())
+
+def link_or_copy(src: str, dst: str):
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    tmp = f"{dst}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+class RenderCache:
+    def __init__(self, root: str = RENDER_CACHE_DIR, max_bytes: int = RENDER_CACHE_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.version = manim_version()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        # path -> size, least recently used first; only built from disk here, then kept current by get and put.
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".mp4"):
+                    path = os.path.join(dirpath, filename)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self._entries[path] = size
+            self._total += size
+
+    def key(self, code: str, quality: str) -> str:
+        payload = f"{self.version}\0{quality}\0{normalize_source(code)}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.mp4")
+
+    def get(self, key: str, dest: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            # The mtime keeps the LRU order across restarts.
+            os.utime(path)
+            link_or_copy(path, dest)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            if path in self._entries:
+                self._entries.move_to_end(path)
+        logging.info(f"Render cache hit for {key[:12]}")
+        return os.path.abspath(dest)
+
+    def put(self, key: str, video_path: str):
+        path = self._path(key)
+        link_or_copy(video_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._total += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total -= size
+            self.evictions += 1
+            logging.info(f"Evicted {path} from render cache")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "manim_version": self.version,
+        }
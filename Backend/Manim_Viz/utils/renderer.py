@@ -0,0 +1,91 @@
+import glob
+import os
+import subprocess
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+RENDER_WORKERS = int(os.environ.get("MANIM_RENDER_WORKERS", os.cpu_count() or 1))
+WORK_ROOT = os.environ.get("MANIM_WORK_DIR", "manim_jobs")
+SCENE_FILE = "scene.py"
+DEFAULT_QUALITY = "l"
+DRAFT_QUALITY = "l"
+RENDER_TIMEOUT = 60
+RENDER_SECONDS_PER_VIDEO_SECOND = float(os.environ.get("MANIM_RENDER_SECONDS_PER_VIDEO_SECOND", 2))
+# Looping generated code holds a render worker until the timeout, so no attempt may run longer than this.
+MAX_RENDER_TIMEOUT = float(os.environ.get("MANIM_MAX_RENDER_TIMEOUT", 1200))
+
+QUALITY_NAMES = {
+    "l": "low_quality",
+    "m": "medium_quality",
+    "h": "high_quality",
+    "k": "fourk_quality",
+}
+QUALITY_TIMEOUT_FACTORS = {"l": 1, "m": 2, "h": 5, "k": 12}
+
+_render_pool = None
+
+def get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return _render_pool
+
+def render_timeout(quality: str, fps: Optional[int] = None, duration: Optional[float] = None) -> float:
+    timeout = max(RENDER_TIMEOUT, (duration or 0) * RENDER_SECONDS_PER_VIDEO_SECOND) * QUALITY_TIMEOUT_FACTORS[quality]
+    timeout = timeout * max(1, fps / 30) if fps else timeout
+    return min(timeout, MAX_RENDER_TIMEOUT)
+
+def partial_movie_files(work_dir: str) -> List[str]:
+    return glob.glob(os.path.join(work_dir, "media", "videos", "*", "*", "partial_movie_files", "*", "*.mp4"))
+
+def discard_incomplete_partial(work_dir: str, since: float):
+    # A killed or crashed render can leave the animation it was writing half-encoded under its final hash,
+    # and Manim would happily reuse it, so drop the newest partial written during the failed attempt.
+    written = [path for path in partial_movie_files(work_dir) if os.path.getmtime(path) >= since]
+    if written:
+        newest = max(written, key=os.path.getmtime)
+        os.remove(newest)
+        logging.info(f"Discarded possibly incomplete partial movie file {newest}")
+
+def find_rendered_video(media_dir: str, scene_name: str, chapter_num: int) -> str:
+    # Manim names the quality folder after the resolution and frame rate (480p15, 1080p60, ...), so look it up.
+    matches = glob.glob(os.path.join(media_dir, "videos", os.path.splitext(SCENE_FILE)[0], "*", f"{scene_name}.mp4"))
+    if not matches:
+        raise ValueError(f"Manim did not produce {scene_name}.mp4 for chapter {chapter_num}")
+    return os.path.abspath(max(matches, key=os.path.getmtime))
+
+def render_manim_scene(code: str, scene_name: str, chapter_num: int, work_dir: str, quality: str = DEFAULT_QUALITY, fps: Optional[int] = None, timeout: float = RENDER_TIMEOUT) -> str:
+    os.makedirs(work_dir, exist_ok=True)
+    scene_path = os.path.join(work_dir, SCENE_FILE)
+    media_dir = os.path.join(work_dir, "media")
+    with open(scene_path, "w") as f:
+        f.write(code)
+
+    process = None
+    try:
+        command = ["manim", SCENE_FILE, scene_name, f"-q{quality}", "--media_dir", "media"]
+        command += ["--fps", str(fps)] if fps else []
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=work_dir, text=True)
+        stdout, stderr = process.communicate(timeout=timeout)
+
+        if process.returncode == 0:
+            logging.info(f"Manim render successful for chapter {chapter_num}")
+            logging.debug(f"Manim stdout: {stdout}")
+            logging.debug(f"Manim stderr: {stderr}")
+        else:
+            error_msg = f"Manim render failed for chapter {chapter_num} with return code {process.returncode}: {stdout} {stderr}"
+            logging.error(error_msg.split('\n')[-1])
+            raise subprocess.CalledProcessError(process.returncode, command, output=stdout, stderr=stderr)
+
+    except subprocess.TimeoutExpired:
+        logging.error(f"Manim process timed out for chapter {chapter_num}")
+        if process:
+            process.kill()
+            process.communicate()
+        raise
+    except FileNotFoundError:
+        logging.error("Manim command not found. Ensure Manim is installed and in PATH.")
+        raise
+
+    return find_rendered_video(media_dir, scene_name, chapter_num)
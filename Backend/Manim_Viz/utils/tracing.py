@@ -0,0 +1,5 @@
+"""Tracing settings for Manim_Viz: MANIM_TRACE_FILE and MANIM_TRACE_OTEL. The spans themselves are common/tracing.py."""
+from common import tracing
+from common.tracing import metrics, record_usage, span, traced_call
+
+tracing.configure("manim_viz", "MANIM", ("job_id", "chapter", "attempt"))
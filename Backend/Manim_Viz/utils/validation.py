@@ -0,0 +1,143 @@
+import ast
+import builtins
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+SCENE_BASES = {
+    "Scene",
+    "ThreeDScene",
+    "SpecialThreeDScene",
+    "MovingCameraScene",
+    "ZoomedScene",
+    "VectorScene",
+    "LinearTransformationScene",
+}
+
+ALLOWED_IMPORTS = {
+    "__future__",
+    "cmath",
+    "collections",
+    "colour",
+    "dataclasses",
+    "decimal",
+    "enum",
+    "fractions",
+    "functools",
+    "itertools",
+    "manim",
+    "math",
+    "numpy",
+    "operator",
+    "random",
+    "scipy",
+    "string",
+    "typing",
+}
+
+class ManimCodeError(Exception):
+    pass
+
+@lru_cache(maxsize=1)
+def manim_exports() -> Optional[Set[str]]:
+    try:
+        import manim
+    except ImportError:
+        logging.warning("Manim is not importable here, skipping symbol checks")
+        return None
+    return set(dir(manim))
+
+def _base_name(base: ast.expr) -> str:
+    if isinstance(base, ast.Attribute):
+        return base.attr
+    return base.id if isinstance(base, ast.Name) else ""
+
+def find_scene_classes(tree: ast.Module) -> List[ast.ClassDef]:
+    scene_names = set(SCENE_BASES)
+    scenes = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and any(_base_name(base) in scene_names for base in node.bases):
+            scene_names.add(node.name)
+            scenes.append(node)
+    subclassed = {_base_name(base) for scene in scenes for base in scene.bases}
+    return [scene for scene in scenes if scene.name not in subclassed]
+
+def defines_construct(scene: ast.ClassDef, classes: Dict[str, ast.ClassDef]) -> bool:
+    """Whether scene, or a class it inherits from in the same module, defines construct."""
+    seen = set()
+    pending = [scene]
+    while pending:
+        cls = pending.pop()
+        if cls.name in seen:
+            continue
+        seen.add(cls.name)
+        if any(isinstance(node, ast.FunctionDef) and node.name == "construct" for node in cls.body):
+            return True
+        pending += [classes[_base_name(base)] for base in cls.bases if _base_name(base) in classes]
+    return False
+
+def check_imports(tree: ast.Module):
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules = [node.module or ""]
+        else:
+            continue
+        for module in modules:
+            if module.split(".")[0] not in ALLOWED_IMPORTS:
+                raise ManimCodeError(f"ImportError: import of '{module}' is not allowed (line {node.lineno})")
+
+def _defined_names(tree: ast.Module) -> Set[str]:
+    names = set(dir(builtins))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+    return names
+
+def check_symbols(tree: ast.Module):
+    exports = manim_exports()
+    if exports is None:
+        return
+    star_import = False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module == "manim":
+            for alias in node.names:
+                if alias.name == "*":
+                    star_import = True
+                elif alias.name not in exports:
+                    raise ManimCodeError(f"ImportError: cannot import name '{alias.name}' from 'manim' (line {node.lineno})")
+        elif isinstance(node, ast.ImportFrom) and node.names[0].name == "*":
+            # Other star imports make undefined names impossible to attribute.
+            return
+
+    available = _defined_names(tree) | (exports if star_import else set())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in available:
+            raise ManimCodeError(f"NameError: name '{node.id}' is not defined (line {node.lineno})")
+
+def validate_manim_code(code: str) -> str:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise ManimCodeError(f"SyntaxError: {e.msg} (line {e.lineno}): {(e.text or '').strip()}")
+
+    scenes = find_scene_classes(tree)
+    if not scenes:
+        raise ManimCodeError(f"No Scene subclass found. Define a class deriving from one of: {', '.join(sorted(SCENE_BASES))}")
+    scene = scenes[-1]
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+    if not defines_construct(scene, classes):
+        raise ManimCodeError(f"Scene class {scene.name} has no construct method")
+
+    check_imports(tree)
+    check_symbols(tree)
+    return scene.name
@@ -0,0 +1,163 @@
+import multiprocessing
+import os
+import resource
+import subprocess
+import threading
+import traceback
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+
+from utils.renderer import DEFAULT_QUALITY, QUALITY_NAMES, RENDER_TIMEOUT, RENDER_WORKERS, SCENE_FILE
+
+WARM_WORKERS_ENABLED = os.environ.get("MANIM_WARM_WORKERS", "1") == "1"
+MAX_JOBS_PER_WORKER = int(os.environ.get("MANIM_WORKER_MAX_JOBS", 25))
+MAX_WORKER_RSS_MB = int(os.environ.get("MANIM_WORKER_MAX_RSS_MB", 1500))
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _render_in_namespace(code: str, scene_name: str, work_dir: str, quality: str, fps: Optional[int]) -> str:
+    from manim import tempconfig
+
+    os.makedirs(work_dir, exist_ok=True)
+    scene_path = os.path.abspath(os.path.join(work_dir, SCENE_FILE))
+    with open(scene_path, "w") as f:
+        f.write(code)
+
+    options = {
+        "input_file": scene_path,
+        "media_dir": os.path.join(os.path.dirname(scene_path), "media"),
+        "quality": QUALITY_NAMES[quality],
+        "disable_caching": False,
+        "progress_bar": "none",
+        "verbosity": "WARNING",
+    }
+    if fps:
+        options["frame_rate"] = fps
+    # tempconfig restores the global Manim config afterwards, so module-level config tweaks in one job don't leak into the next.
+    with tempconfig(options):
+        namespace = {"__name__": os.path.splitext(SCENE_FILE)[0], "__file__": scene_path}
+        exec(compile(code, scene_path, "exec"), namespace)
+        scene = namespace[scene_name]()
+        scene.render()
+        return os.path.abspath(str(scene.renderer.file_writer.movie_file_path))
+
+def _worker_main(conn):
+    import manim  # noqa: F401  imported once per worker, reused by every job
+
+    conn.send(("ready", None, _rss_mb()))
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        try:
+            conn.send(("ok", _render_in_namespace(*request), _rss_mb()))
+        except BaseException:
+            conn.send(("error", traceback.format_exc(), _rss_mb()))
+
+class WarmWorker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        # Wait for the Manim import here so start-up cost is not charged to the first job's timeout.
+        _, _, self.rss_mb = self.conn.recv()
+
+    def render(self, code: str, scene_name: str, work_dir: str, quality: str, fps: Optional[int], timeout: float) -> str:
+        command = ["manim", SCENE_FILE, scene_name, f"-q{quality}"]
+        self.conn.send((code, scene_name, work_dir, quality, fps))
+        if not self.conn.poll(timeout):
+            raise subprocess.TimeoutExpired(command, timeout)
+        status, payload, self.rss_mb = self.conn.recv()
+        self.jobs += 1
+        if status == "error":
+            raise subprocess.CalledProcessError(1, command, output="", stderr=payload)
+        return payload
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+class WarmWorkerPool:
+    def __init__(self, size: int = RENDER_WORKERS, max_jobs: int = MAX_JOBS_PER_WORKER, max_rss_mb: int = MAX_WORKER_RSS_MB):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = threading.Semaphore(size)
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="manim-worker")
+        self._idle: List[WarmWorker] = []
+        self._lock = threading.Lock()
+        self.recycled = 0
+
+    def _checkout(self) -> WarmWorker:
+        self._slots.acquire()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return WarmWorker(self._context)
+        except (EOFError, OSError) as e:
+            self._slots.release()
+            logging.error(f"Manim worker failed to start: {e}")
+            raise FileNotFoundError("Manim could not be imported in the worker process") from e
+
+    def _checkin(self, worker: WarmWorker, healthy: bool):
+        try:
+            if healthy and worker.jobs < self.max_jobs and worker.rss_mb < self.max_rss_mb:
+                with self._lock:
+                    self._idle.append(worker)
+                return
+            logging.info(f"Recycling Manim worker after {worker.jobs} jobs ({worker.rss_mb:.0f} MB)")
+            self.recycled += 1
+            worker.stop() if healthy else worker.kill()
+        finally:
+            self._slots.release()
+
+    def render(self, code: str, scene_name: str, chapter_num: int, work_dir: str, quality: str = DEFAULT_QUALITY, fps: Optional[int] = None, timeout: float = RENDER_TIMEOUT) -> str:
+        worker = self._checkout()
+        healthy = False
+        try:
+            video_path = worker.render(code, scene_name, work_dir, quality, fps, timeout)
+            healthy = True
+            logging.info(f"Manim render successful for chapter {chapter_num}")
+            return video_path
+        except subprocess.TimeoutExpired:
+            logging.error(f"Manim worker timed out for chapter {chapter_num}")
+            raise
+        except subprocess.CalledProcessError as e:
+            healthy = True
+            logging.error(f"Manim render failed for chapter {chapter_num}: {e.stderr.strip().splitlines()[-1]}")
+            raise
+        except (EOFError, OSError) as e:
+            logging.error(f"Manim worker died while rendering chapter {chapter_num}: {e}")
+            raise subprocess.CalledProcessError(-1, ["manim", SCENE_FILE, scene_name], output="", stderr=f"Manim worker exited unexpectedly: {e}")
+        finally:
+            self._checkin(worker, healthy)
+
+    def submit(self, code: str, scene_name: str, chapter_num: int, work_dir: str, quality: str = DEFAULT_QUALITY, fps: Optional[int] = None, timeout: float = RENDER_TIMEOUT) -> Future:
+        return self._executor.submit(self.render, code, scene_name, chapter_num, work_dir, quality, fps, timeout)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
@@ -1,19 +1,35 @@
 import os
 import json
 import asyncio
-import shutil
 import argparse
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, Field
 from dataclasses import dataclass
-from crawl4ai import AsyncWebCrawler
 from pydantic_ai import Agent, RunContext
-import fitz
 
-from utils.subtitles_generator import create_srt_file_from_json_data
-from utils.image_downloader import fetch_and_save_image_from_url
-from utils.image_generator import generate_image
-from utils.video_generator import prepare_images_for_ffmpeg, generate_video_with_audio_and_subtitles
+from utils.subtitles_generator import create_srt_file_and_manifest
+from utils.image_pipeline import acquire_scene_images
+from utils.image_preprocessor import PREPROCESS_HANDOFF
+from utils.video_generator import prepare_images_for_ffmpeg, render_short
+from utils.workspace import JobWorkspace
+from utils.pdf_ingest import CHUNK_CHARS, extract_pdf_text, iter_chunks, map_reduce, stream_pdf_pages
+from utils.crawler import SharedCrawler
+from utils.scene_pipeline import render_scenes_streaming
+from utils.providers import estimate_tokens, get_provider
+from utils.tracing import record_usage, span
+
+MAX_CONCURRENT_INPUTS = int(os.environ.get("MAX_CONCURRENT_INPUTS", 2))
+# streaming encodes each scene as soon as its own image and audio are ready; staged runs every stage to completion in turn.
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "streaming")
+# mp4 joins the scenes into output_video.mp4; hls streams each scene into hls/master.m3u8 as it is encoded, which needs the streaming pipeline.
+OUTPUT_FORMAT = os.environ.get("OUTPUT_FORMAT", "mp4")
+crawler = SharedCrawler()
+# auto summarizes only documents longer than PDF_DIRECT_CHARS; always/never force it either way.
+PDF_SUMMARY_MODE = os.environ.get("PDF_SUMMARY_MODE", "auto")
+PDF_DIRECT_CHARS = int(os.environ.get("PDF_DIRECT_CHARS", 2 * CHUNK_CHARS))
+# Up-front guesses for the tokens-per-minute budget; the provider settles them against the reported usage.
+SUMMARY_OUTPUT_TOKENS = 500
+SCRIPT_OUTPUT_TOKENS = 4000
 
 class Scene(BaseModel):
     scene_number: int = Field(..., description="The sequential number of the scene.")
@@ -88,7 +104,7 @@ system_prompt = """You are an expert content strategist and video scriptwriter s
 
 @dataclass
 class Dependencies:
-    client: AsyncWebCrawler
+    client: Optional[SharedCrawler]
     content: str
 
 video_script_agent = Agent(
@@ -99,63 +115,109 @@ video_script_agent = Agent(
     name="Video Script Generator",
 )
 
+chunk_summary_agent = Agent(
+    model='openai:gpt-4o-mini',
+    system_prompt=(
+        "You condense one excerpt of a longer document for a video scriptwriter. Keep the key facts, statistics, "
+        "names, quotes and surprising or emotional details. Drop boilerplate, references and repetition. "
+        "Answer with plain prose only, at most 300 words."
+    ),
+    result_type=str,
+    name="Document Chunk Summarizer",
+)
+
 @video_script_agent.tool
 async def extract_webpage_content(ctx: RunContext[Dependencies]) -> str:
-    return ctx.deps.content if ctx.deps.client is None else (await ctx.deps.client.arun(url=ctx.deps.content)).markdown
-
-def extract_text_content_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    text_content = ""
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        text_content += page.get_text("text")
-    return text_content
+    return ctx.deps.content if ctx.deps.client is None else await ctx.deps.client.crawl(ctx.deps.content)
+
+async def summarize_chunk(text: str) -> str:
+    with span("llm", agent="chunk_summary", chars=len(text)) as current:
+        result = await get_provider("openai_chat").call(lambda: chunk_summary_agent.run(text), tokens=estimate_tokens(text, SUMMARY_OUTPUT_TOKENS))
+        record_usage(current, result)
+        return result.data
+
+async def prepare_pdf_content(pdf_path: str) -> str:
+    with span("pdf.extract", mode=PDF_SUMMARY_MODE) as current:
+        if PDF_SUMMARY_MODE == "never":
+            return await asyncio.to_thread(extract_pdf_text, pdf_path)
+        if PDF_SUMMARY_MODE == "auto":
+            text = await asyncio.to_thread(extract_pdf_text, pdf_path)
+            current.set(chars=len(text))
+            if len(text) <= PDF_DIRECT_CHARS:
+                return text
+            print(f"{pdf_path} has {len(text)} characters, condensing it before scripting")
+        current.set(summarized=True)
+        return await map_reduce(iter_chunks(stream_pdf_pages(pdf_path)), summarize_chunk)
 
 async def generate_video_from_content(content: str, content_type: str):
-    async with AsyncWebCrawler() as crawler:
-        dependencies = Dependencies(
-            client=crawler if content_type == 'url' else None,
-            content=extract_text_content_from_pdf(content) if content_type == 'pdf' else content
-        )
-        
-        if content_type not in ['url', 'pdf']:
-            raise ValueError("Unsupported content type. Use 'url' or 'pdf'.")
-
-        result = await video_script_agent.run('Crawl the webpage of a given URL and do your job', deps=dependencies)
-        scenes = result.data.scenes
-        json_output = json.dumps([scene.model_dump() for scene in scenes], indent=2)
-        print(json_output)
-
-        image_urls = []
-        for item in json.loads(json_output):
-            print(f"Generating image for scene {item['scene_number']}")
-            image_url = generate_image(item['image_prompt'])
-            image_urls.append({"url": image_url, "scene": item['scene_number']})
-
-        create_srt_file_from_json_data(json.loads(json_output))
-
-        for item in image_urls:
-            print(f"Downloading image for scene {item['scene']}")
-            fetch_and_save_image_from_url(item['url'], f"image{item['scene']}")
-
-    input_directory = "images"
-    output_directory = "images_processed"
-    audio_directory = "audios"
-    final_video_output = "output_video.mp4"
-
-    os.makedirs('images_processed', exist_ok=True)
-    prepare_images_for_ffmpeg(input_directory, output_directory)
-    generate_video_with_audio_and_subtitles(output_directory, audio_directory, final_video_output)
-    shutil.rmtree(output_directory, ignore_errors=True)
-
-async def process_multiple_contents(content_type: str, contents: List[str]):
-    for content in contents:
-        await generate_video_from_content(content, content_type)
+    workspace = JobWorkspace.create()
+    try:
+        with span("job", job_id=workspace.job_id, content_type=content_type):
+            print(f"Processing {content} in {workspace.root}")
+            if content_type not in ['url', 'pdf']:
+                raise ValueError("Unsupported content type. Use 'url' or 'pdf'.")
+
+            dependencies = Dependencies(
+                client=crawler if content_type == 'url' else None,
+                content=await prepare_pdf_content(content) if content_type == 'pdf' else content
+            )
+
+            with span("llm", agent="video_script") as current:
+                result = await get_provider("openai_chat").call(
+                    lambda: video_script_agent.run('Crawl the webpage of a given URL and do your job', deps=dependencies),
+                    tokens=estimate_tokens(system_prompt + dependencies.content, SCRIPT_OUTPUT_TOKENS),
+                )
+                record_usage(current, result)
+            scenes = result.data.scenes
+            json_output = json.dumps([scene.model_dump() for scene in scenes], indent=2)
+            print(json_output)
+
+            if PIPELINE_MODE == "streaming" or OUTPUT_FORMAT == "hls":
+                await render_scenes_streaming(json.loads(json_output), workspace, output_format=OUTPUT_FORMAT)
+                return os.path.join(workspace.hls_dir, "master.m3u8") if OUTPUT_FORMAT == "hls" else workspace.output_video
+
+            image_task = asyncio.create_task(acquire_scene_images(json.loads(json_output), workspace))
+
+            await create_srt_file_and_manifest(json.loads(json_output), workspace)
+
+            await image_task
+
+            # Image preprocessing and encoding block, so they run off the event loop and other inputs keep making progress.
+            frames = await asyncio.to_thread(prepare_images_for_ffmpeg, workspace)
+            await asyncio.to_thread(render_short, workspace, frames if PREPROCESS_HANDOFF == "raw" else None)
+            if not os.path.exists(workspace.output_video):
+                raise Exception(f"No video was written to {workspace.output_video}")
+            return workspace.output_video
+    except BaseException:
+        # A failed input has nothing worth keeping, so its whole workspace goes.
+        workspace.discard()
+        raise
+    finally:
+        workspace.cleanup()
+
+async def process_multiple_contents(content_type: str, contents: List[str], max_concurrent: int = MAX_CONCURRENT_INPUTS):
+    slots = asyncio.Semaphore(max_concurrent)
+
+    async def process(content):
+        async with slots:
+            return await generate_video_from_content(content, content_type)
+
+    try:
+        if content_type == 'url' and len(contents) > 1:
+            # Crawl the whole batch up front on the shared browser; the script agent's tool calls then hit the cache.
+            await crawler.crawl_many(contents)
+        results = await asyncio.gather(*(process(content) for content in contents), return_exceptions=True)
+    finally:
+        await crawler.close()
+    for content, result in zip(contents, results):
+        print(f"Failed to process {content}: {result}" if isinstance(result, Exception) else f"{content} -> {result}")
+    return results
 
 if __name__ == "__main__":
     argument_parser = argparse.ArgumentParser(description="Generate YouTube Shorts script from URL or PDF.")
     argument_parser.add_argument('content_type', type=str, choices=['url', 'pdf'], help="Type of content: url or pdf.")
     argument_parser.add_argument('contents', nargs='+', help="URL or path to PDF files.")
+    argument_parser.add_argument('--max-concurrent', type=int, default=MAX_CONCURRENT_INPUTS, help="How many inputs to process at once.")
     parsed_args = argument_parser.parse_args()
 
-    asyncio.run(process_multiple_contents(parsed_args.content_type, parsed_args.contents))
\ No newline at end of file
+    asyncio.run(process_multiple_contents(parsed_args.content_type, parsed_args.contents, parsed_args.max_concurrent))
\ No newline at end of file
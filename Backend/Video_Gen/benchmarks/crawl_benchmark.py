@@ -0,0 +1,52 @@
+"""Crawl a batch of fixture articles cold, warm and after the TTL expires, at several page-pool sizes.
+
+    python -m benchmarks.crawl_benchmark --urls 20 --concurrency 1 4 8 --delay 0.2
+"""
+import time
+import asyncio
+import argparse
+import tempfile
+
+from utils.crawler import CrawlCache, SharedCrawler
+from benchmarks.fixture_server import start_fixture_server
+
+
+async def run_round(crawler, urls):
+    start = time.perf_counter()
+    results = await crawler.crawl_many(urls)
+    failures = [url for url, result in results.items() if isinstance(result, Exception)]
+    return time.perf_counter() - start, failures
+
+
+async def benchmark(base_url, url_count, concurrency):
+    urls = [f"{base_url}/article/{i}" for i in range(1, url_count + 1)]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = CrawlCache(cache_dir)
+        crawler = SharedCrawler(cache, concurrency)
+        try:
+            cold, failures = await run_round(crawler, urls)
+            warm, _ = await run_round(crawler, urls)
+            cache.ttl = 0
+            revalidated, _ = await run_round(crawler, urls)
+        finally:
+            await crawler.close()
+    print(f"concurrency={concurrency:<3} cold={cold:7.2f}s warm={warm:7.3f}s revalidate={revalidated:7.3f}s "
+          f"failures={len(failures)} {cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--urls", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--delay", type=float, default=0.2, help="Simulated server latency in seconds.")
+    args = parser.parse_args()
+    server, base_url = start_fixture_server(delay=args.delay)
+    try:
+        for concurrency in args.concurrency:
+            asyncio.run(benchmark(base_url, args.urls, concurrency))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
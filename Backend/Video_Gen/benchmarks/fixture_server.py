@@ -0,0 +1,150 @@
+"""Local HTTP server with deterministic fixtures, so the pipeline can be benchmarked without the network.
+
+Serves articles for the crawler, and stands in for the image and TTS providers:
+
+    GET  /article/<n>              HTML article with an ETag
+    POST /v1/images/generations    DALL-E style response pointing at /image/<n>.png
+    GET  /image/<n>.png            1024x1792 PNG
+    POST /v1/speak                 MP3 narration, about 0.35s per word (needs ffmpeg)
+
+Run standalone with `python -m benchmarks.fixture_server --port 8765`, or call start_fixture_server() from a benchmark.
+"""
+import io
+import json
+import time
+import hashlib
+import argparse
+import threading
+import subprocess
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ARTICLE_PARAGRAPHS = 12
+LAST_MODIFIED = "Mon, 06 Jan 2025 00:00:00 GMT"
+IMAGE_SIZE = (1024, 1792)
+SECONDS_PER_WORD = 0.35
+
+
+def article_html(article_id):
+    paragraphs = "\n".join(
+        f"<p>Paragraph {i} of article {article_id}. Researchers measured {article_id * 7 + i} samples and found a "
+        f"{(article_id + i) % 40 + 10}% change compared with the previous year, which surprised everyone involved.</p>"
+        for i in range(1, ARTICLE_PARAGRAPHS + 1)
+    )
+    return (
+        f"<!doctype html><html><head><title>Fixture article {article_id}</title></head>"
+        f"<body><article><h1>Fixture article {article_id}</h1>\n{paragraphs}\n</article></body></html>"
+    ).encode()
+
+
+@lru_cache(maxsize=64)
+def fixture_png(image_id):
+    from PIL import Image
+
+    # A gradient rather than a flat colour, so resizing and encoding do representative work.
+    gradient = Image.linear_gradient("L").resize(IMAGE_SIZE)
+    hue = (image_id * 47) % 256
+    image = Image.merge("RGB", (gradient, gradient.point(lambda v: (v + hue) % 256), gradient.transpose(Image.Transpose.FLIP_TOP_BOTTOM)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=32)
+def fixture_mp3(duration):
+    command = [
+        "ffmpeg", "-v", "error", "-f", "lavfi", "-i", f"sine=frequency=220:duration={duration}",
+        "-ac", "1", "-ar", "24000", "-c:a", "libmp3lame", "-b:a", "48k", "-f", "mp3", "pipe:1"
+    ]
+    return subprocess.run(command, capture_output=True, check=True).stdout
+
+
+def narration_seconds(text):
+    # Rounded to half seconds so the MP3 cache stays small.
+    return max(1.0, round(len(text.split()) * SECONDS_PER_WORD * 2) / 2)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def fixture(self):
+        path = self.path.split("?")[0]
+        name = path.rsplit("/", 1)[-1]
+        if path.startswith("/article/") and name.isdigit():
+            return article_html(int(name)), "text/html; charset=utf-8"
+        if path.startswith("/image/") and name.endswith(".png") and name[:-4].isdigit():
+            return fixture_png(int(name[:-4])), "image/png"
+        return None, None
+
+    def send_body(self, body, content_type, etag=None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def send_fixture(self):
+        time.sleep(self.delay)
+        body, content_type = self.fixture()
+        if body is None:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_body(body, content_type, etag)
+
+    def do_GET(self):
+        self.send_fixture()
+
+    def do_HEAD(self):
+        self.send_fixture()
+
+    def do_POST(self):
+        time.sleep(self.delay)
+        request = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?")[0]
+        if path == "/v1/images/generations":
+            prompt = json.loads(request or b"{}").get("prompt", "")
+            image_id = int(hashlib.sha256(prompt.encode()).hexdigest()[:6], 16) % 1000
+            body = json.dumps({"data": [{"url": f"{self.base_url()}/image/{image_id}.png"}]}).encode()
+            self.send_body(body, "application/json")
+        elif path == "/v1/speak":
+            self.send_body(fixture_mp3(narration_seconds(request.decode("utf-8", "replace"))), "audio/mpeg")
+        else:
+            self.send_error(404)
+
+
+def start_fixture_server(host="127.0.0.1", port=0, delay=0.0):
+    """Serve fixtures from a daemon thread. Returns (server, base_url); call server.shutdown() when done."""
+    handler = type("Handler", (FixtureHandler,), {"delay": delay})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve benchmark fixtures over HTTP.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before every response.")
+    args = parser.parse_args()
+    server, base_url = start_fixture_server(port=args.port, delay=args.delay)
+    print(f"Serving fixtures at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
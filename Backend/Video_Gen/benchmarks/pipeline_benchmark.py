@@ -0,0 +1,148 @@
+"""Benchmark generate_video_from_content end to end against local fixtures, with no API keys or network.
+
+The script LLM is a FunctionModel, the crawler is FakeCrawler, and DALL-E, the image CDN and Deepgram are served
+by the fixture server. Every configuration runs in a fresh interpreter so CPU time and peak RSS are its own.
+
+    python -m benchmarks.pipeline_benchmark --scenes 1 3 10 --concurrency 1 4 --modes streaming staged
+    python -m benchmarks.pipeline_benchmark --json results.json
+    python -m benchmarks.pipeline_benchmark --compare results.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from benchmarks.fixture_server import start_fixture_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGRESSION_THRESHOLD = 1.2
+
+
+def child_environment(base_url, mode, concurrency, scratch_dir):
+    return {
+        **os.environ,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        "DEEPGRAM_API_KEY": "benchmark",
+        "OPENAI_IMAGES_URL": f"{base_url}/v1/images/generations",
+        "DEEPGRAM_SPEAK_URL": f"{base_url}/v1/speak",
+        "PIPELINE_MODE": mode,
+        "IMAGE_CONCURRENCY": str(concurrency),
+        "TTS_CONCURRENCY": str(concurrency),
+        "SCENE_ENCODE_WORKERS": str(concurrency),
+        "VIDEO_WORKSPACE_ROOT": os.path.join(scratch_dir, "workspaces"),
+        "PREPROCESS_CACHE_DIR": os.path.join(scratch_dir, "letterbox"),
+        "CRAWL_CACHE_DIR": os.path.join(scratch_dir, "crawl"),
+        "VIDEO_TRACE_FILE": "",
+    }
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_single(scene_count):
+    """Runs inside the child interpreter; prints one JSON line with the measurements."""
+    import agent
+    from benchmarks.stubs import FakeCrawler, script_model
+    from utils.tracing import metrics
+
+    agent.crawler = FakeCrawler()
+    metrics.reset()
+    cpu_start, wall_start = cpu_seconds(), time.perf_counter()
+    with agent.video_script_agent.override(model=script_model(scene_count)):
+        output = asyncio.run(agent.generate_video_from_content("https://fixtures.local/article/1", "url"))
+    wall = time.perf_counter() - wall_start
+    cpu = cpu_seconds() - cpu_start
+
+    print(json.dumps({
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(cpu, 3),
+        # ru_maxrss is in kilobytes on Linux; the children figure is the largest single ffmpeg or pool worker.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        "output_bytes": os.path.getsize(output) if os.path.exists(output) else 0,
+        "stages": {name: {"seconds": round(seconds, 3), "count": count} for name, (seconds, count) in sorted(metrics.snapshot().items())},
+    }))
+
+
+def run_configuration(base_url, mode, scene_count, concurrency):
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.pipeline_benchmark", "--single", "--scenes", str(scene_count)],
+            cwd=BACKEND_DIR, env=child_environment(base_url, mode, concurrency, scratch_dir), capture_output=True, text=True
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{mode} scenes={scene_count} concurrency={concurrency} failed:\n{completed.stderr[-4000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {"mode": mode, "scenes": scene_count, "concurrency": concurrency, **result}
+
+
+def configuration_key(result):
+    return result["mode"], result["scenes"], result["concurrency"]
+
+
+def print_result(result, baseline=None):
+    top_stages = sorted(result["stages"].items(), key=lambda item: -item[1]["seconds"])[:4]
+    line = (f"{result['mode']:<9} scenes={result['scenes']:<3} concurrency={result['concurrency']:<3} "
+            f"wall={result['wall_seconds']:7.2f}s cpu={result['cpu_seconds']:7.2f}s "
+            f"rss={result['peak_rss_mb']:6.1f}MB child_rss={result['peak_child_rss_mb']:6.1f}MB")
+    if baseline:
+        line += f" vs_baseline={result['wall_seconds'] / baseline['wall_seconds']:5.2f}x"
+    print(line)
+    print("    " + "  ".join(f"{name}={stage['seconds']:.2f}s/{stage['count']}" for name, stage in top_stages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenes", type=int, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--modes", nargs="+", choices=["streaming", "staged"], default=["streaming", "staged"])
+    parser.add_argument("--delay", type=float, default=0.1, help="Simulated provider latency in seconds.")
+    parser.add_argument("--json", help="Write all results to this file.")
+    parser.add_argument("--compare", help="Results file from an earlier run; exit non-zero when a configuration got slower.")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args.scenes[0])
+        return
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {configuration_key(result): result for result in json.load(f)}
+
+    results = []
+    server, base_url = start_fixture_server(delay=args.delay)
+    try:
+        for mode in args.modes:
+            for scene_count in args.scenes:
+                for concurrency in args.concurrency:
+                    result = run_configuration(base_url, mode, scene_count, concurrency)
+                    print_result(result, baseline.get(configuration_key(result)))
+                    results.append(result)
+    finally:
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    regressions = [
+        result for result in results
+        if configuration_key(result) in baseline
+        and result["wall_seconds"] > baseline[configuration_key(result)]["wall_seconds"] * REGRESSION_THRESHOLD
+    ]
+    if regressions:
+        print(f"{len(regressions)} configuration(s) are more than {REGRESSION_THRESHOLD:.1f}x slower than the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Deterministic stand-ins for the script LLM and the crawler, so benchmarks run offline and repeatably."""
+import json
+
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import FunctionModel
+
+from benchmarks.fixture_server import article_html
+
+CRAWL_TOOL = "extract_webpage_content"
+
+
+class FakeCrawler:
+    """Same interface as SharedCrawler, answering every URL with a fixture article without a browser or network."""
+
+    def __init__(self):
+        self.crawled = []
+
+    async def crawl(self, url):
+        self.crawled.append(url)
+        article_id = sum(url.encode()) % 1000
+        return article_html(article_id).decode()
+
+    async def crawl_many(self, urls):
+        return {url: await self.crawl(url) for url in dict.fromkeys(urls)}
+
+    async def close(self):
+        pass
+
+
+def canned_scenes(scene_count):
+    return [
+        {
+            "scene_number": n,
+            "text": f"Scene {n} of {scene_count}. Researchers found a surprising change this year, and here is why it matters to you.",
+            "image_prompt": f"Cinematic illustration number {n} of a laboratory at dawn",
+            "timeframe": 4,
+        }
+        for n in range(1, scene_count + 1)
+    ]
+
+
+def script_model(scene_count):
+    """A FunctionModel that calls the crawl tool once, like the real agent does, then returns scene_count scenes."""
+
+    def respond(messages, info):
+        crawled = any(
+            isinstance(part, ToolReturnPart) and part.tool_name == CRAWL_TOOL
+            for message in messages for part in message.parts
+        )
+        if not crawled:
+            return ModelResponse(parts=[ToolCallPart(tool_name=CRAWL_TOOL, args={})])
+        result_tools = getattr(info, "output_tools", None) or info.result_tools
+        if not result_tools:
+            return ModelResponse(parts=[TextPart(json.dumps({"scenes": canned_scenes(scene_count)}))])
+        return ModelResponse(parts=[ToolCallPart(tool_name=result_tools[0].name, args={"scenes": canned_scenes(scene_count)})])
+
+    return FunctionModel(respond)
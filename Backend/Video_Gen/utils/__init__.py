@@ -0,0 +1,17 @@
+import os
+import sys
+import logging
+
+# Both services import their shared code from Backend/common, whichever directory they were started from.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BACKEND_DIR not in sys.path:
+    sys.path.append(BACKEND_DIR)
+
+# Video_Gen reports progress with print, so the shared code's log lines are printed the same way.
+_common_logger = logging.getLogger("common")
+if not _common_logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _common_logger.addHandler(_handler)
+    _common_logger.setLevel(logging.INFO)
+    _common_logger.propagate = False
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import httpx
+from crawl4ai import AsyncWebCrawler
+
+from .tracing import span
+
+CRAWL_CACHE_DIR = os.environ.get("CRAWL_CACHE_DIR", os.path.join(".cache", "crawl"))
+CRAWL_CACHE_TTL = int(os.environ.get("CRAWL_CACHE_TTL", 24 * 3600))
+CRAWL_CONCURRENCY = int(os.environ.get("CRAWL_CONCURRENCY", 4))
+
+
+class CrawlCache:
+    """Crawled markdown on disk, keyed by URL. Entries older than the TTL are revalidated with their ETag."""
+
+    def __init__(self, cache_dir=CRAWL_CACHE_DIR, ttl=CRAWL_CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(url.encode()).hexdigest()}.json")
+
+    def load(self, url):
+        try:
+            with open(self._path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, url, markdown, etag=None, last_modified=None):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(url)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "markdown": markdown, "etag": etag, "last_modified": last_modified, "fetched_at": time.time()}, f)
+        os.replace(tmp_path, path)
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    async def revalidate(self, client, entry):
+        """Conditional GET; True when the server answers 304 and the cached markdown is still good."""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if not headers:
+            return False
+        try:
+            response = await client.get(entry["url"], headers=headers)
+        except httpx.HTTPError as e:
+            print(f"Could not revalidate {entry['url']}: {e}")
+            return False
+        if response.status_code != 304:
+            return False
+        self.store(entry["url"], entry["markdown"], entry.get("etag"), entry.get("last_modified"))
+        return True
+
+    def stats(self):
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
+
+
+class SharedCrawler:
+    """One AsyncWebCrawler (one browser) per process, started on the first URL that is not served from the cache."""
+
+    def __init__(self, cache=None, concurrency=CRAWL_CONCURRENCY):
+        self.cache = cache or CrawlCache()
+        self.concurrency = concurrency
+        self._crawler = None
+        self._start_lock = None
+        self._pages = None
+        self._http_client = None
+
+    async def _get_crawler(self):
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._crawler is None:
+                crawler = AsyncWebCrawler()
+                await crawler.__aenter__()
+                self._crawler = crawler
+                print("Started shared web crawler")
+        return self._crawler
+
+    def _get_http_client(self):
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(timeout=httpx.Timeout(15.0, connect=5.0), follow_redirects=True)
+        return self._http_client
+
+    async def crawl(self, url):
+        with span("crawl", url=url) as current:
+            entry = self.cache.load(url)
+            if entry and self.cache.is_fresh(entry):
+                self.cache.hits += 1
+                current.set(cache_hit=True)
+                return entry["markdown"]
+            if entry and await self.cache.revalidate(self._get_http_client(), entry):
+                self.cache.revalidated += 1
+                current.set(cache_hit=True, revalidated=True)
+                return entry["markdown"]
+
+            self.cache.misses += 1
+            current.set(cache_hit=False)
+            crawler = await self._get_crawler()
+            if self._pages is None:
+                self._pages = asyncio.Semaphore(self.concurrency)
+            # Every arun opens a browser page, so the semaphore bounds the page pool.
+            async with self._pages:
+                result = await crawler.arun(url=url)
+            if not getattr(result, "success", True):
+                raise RuntimeError(f"Crawl of {url} failed: {getattr(result, 'error_message', 'unknown error')}")
+            headers = {key.lower(): value for key, value in (getattr(result, "response_headers", None) or {}).items()}
+            markdown = str(result.markdown or "")
+            self.cache.store(url, markdown, headers.get("etag"), headers.get("last-modified"))
+            return markdown
+
+    async def crawl_many(self, urls):
+        """Crawl a batch concurrently. Returns {url: markdown or the exception it raised}."""
+        unique_urls = list(dict.fromkeys(urls))
+        results = await asyncio.gather(*(self.crawl(url) for url in unique_urls), return_exceptions=True)
+        return dict(zip(unique_urls, results))
+
+    async def close(self):
+        if self._crawler is not None:
+            await self._crawler.__aexit__(None, None, None)
+            self._crawler = None
+        # The lock and page pool belong to the event loop that created them, so a later run starts fresh.
+        self._start_lock = None
+        self._pages = None
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
@@ -0,0 +1,20 @@
+"""HLS output for shorts: each scene is segmented as soon as it is encoded and appended, in script order, to a live playlist.
+
+Renditions come from HLS_RENDITIONS ("name:height:video_bitrate[:audio_bitrate]", comma separated); left empty, the
+encoded scenes are stream-copied into a single rendition, which works because they are encoded with a keyframe every
+HLS_SEGMENT_SECONDS. The writer itself is common/hls.py.
+"""
+import os
+
+from common import hls
+from common.hls import parse_renditions
+
+HLS_SEGMENT_SECONDS = float(os.environ.get("HLS_SEGMENT_SECONDS", 4))
+HLS_RENDITIONS = os.environ.get("HLS_RENDITIONS", "")
+
+
+class HLSWriter(hls.HLSWriter):
+    label = "scene"
+
+    def __init__(self, output_dir, order, renditions=None, segment_seconds=HLS_SEGMENT_SECONDS, background_music=None, music_volume=0.1):
+        super().__init__(output_dir, order, renditions or parse_renditions(HLS_RENDITIONS), segment_seconds, background_music, music_volume)
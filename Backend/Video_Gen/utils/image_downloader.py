@@ -1,43 +1,35 @@
 import os
-import time
+import uuid
 import mimetypes
-import requests
+import aiofiles
+import httpx
 
+from .providers import get_provider
 
-def fetch_and_save_image_from_url(url, filename, max_retries=3, retry_delay=1):
-    retries = 0
-    while retries < max_retries:
-        try:
-            response = requests.get(url)
-            print(f'{retries} try')
-            
-            # Use ternary operator for status code check
-            status_message = "Success" if response.status_code == 200 else f"Failed to download image. Status code: {response.status_code}"
-            print(status_message) if response.status_code != 200 else None
-            
-            if response.status_code == 200:
-                # content = response.content
-                content_type = response.headers.get('Content-Type')
-                extension = mimetypes.guess_extension(content_type)
-                filename_with_extension = f"{filename}{extension}"
-                
-                os.makedirs('images', exist_ok=True)
 
-                with open(os.path.join('images', filename_with_extension), 'wb') as file:
-                    file.write(response.content)
+async def fetch_and_save_image_async(client, url, filename, output_dir='images'):
+    async def download():
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            extension = mimetypes.guess_extension(response.headers.get('Content-Type', '').split(';')[0]) or '.png'
+            path = os.path.join(output_dir, f"{filename}{extension}")
+            # A hedged request may be downloading the same image, so each attempt writes its own part file.
+            part_path = f"{path}.{uuid.uuid4().hex[:8]}.part"
+            try:
+                async with aiofiles.open(part_path, 'wb') as file:
+                    async for chunk in response.aiter_bytes():
+                        await file.write(chunk)
+                os.replace(part_path, path)
+            finally:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+            return path
 
-                print(
-                    f"Image '{filename_with_extension}' downloaded successfully.")
-                return
-
-            else:
-                retries = retries + 1 if response.status_code != 200 else retries
-                time.sleep(retry_delay) if response.status_code != 200 else None
-
-        except requests.exceptions.RequestException as e:
-            print(f"Error occurred while downloading image: {e}")
-            retries += 1
-            time.sleep(retry_delay)
-
-    print(f"Failed to download image after {max_retries} retries.")
-    
\ No newline at end of file
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        path = await get_provider("image_cdn").call(download)
+    except httpx.HTTPError as e:
+        print(f"Failed to download image: {e}")
+        return None
+    print(f"Image '{os.path.basename(path)}' downloaded successfully.")
+    return path
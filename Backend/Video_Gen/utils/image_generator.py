@@ -1,8 +1,10 @@
 import os
 import json
-import requests
+import httpx
 
-url = "https://api.openai.com/v1/images/generations"
+from .providers import get_provider
+
+url = os.environ.get("OPENAI_IMAGES_URL", "https://api.openai.com/v1/images/generations")
 
 headers = {
     'Content-Type': 'application/json',
@@ -10,19 +12,21 @@ headers = {
 }
 
 
-def generate_image(prompt: str) -> str:
+def build_image_payload(prompt: str) -> str:
+    return json.dumps({
+        "model": "dall-e-3",
+        "prompt": prompt,
+        "n": 1,
+        "size": "1024x1792"
+    })
+
+
+async def generate_image_async(client: httpx.AsyncClient, prompt: str) -> str:
     if not prompt:
         return None
     try:
-        payload = json.dumps({
-            "model": "dall-e-3",
-            "prompt": prompt,
-            "n": 1,
-            "size": "1024x1802"
-        })
-
-        response = requests.request("POST", url, headers=headers, data=payload)
-
+        payload = build_image_payload(prompt)
+        response = await get_provider("openai_images").call(lambda: client.post(url, headers=headers, content=payload))
         return response.json().get('data')[0]['url']
     except Exception as e:
         print(f"Error generating image: {e}")
@@ -0,0 +1,47 @@
+import os
+import asyncio
+import httpx
+
+from .image_generator import generate_image_async
+from .image_downloader import fetch_and_save_image_async
+from .tracing import span
+
+IMAGE_CONCURRENCY = int(os.environ.get("IMAGE_CONCURRENCY", 5))
+DOWNLOAD_CONCURRENCY = int(os.environ.get("IMAGE_DOWNLOAD_CONCURRENCY", 10))
+
+
+def create_http_client(max_connections=DOWNLOAD_CONCURRENCY + IMAGE_CONCURRENCY):
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(120.0, connect=10.0),
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        follow_redirects=True,
+    )
+
+
+async def acquire_scene_image(client, scene, output_dir, image_slots, download_slots):
+    async with image_slots:
+        print(f"Generating image for scene {scene['scene_number']}")
+        with span("image.generate", scene=scene['scene_number']):
+            image_url = await generate_image_async(client, scene['image_prompt'])
+    if not image_url:
+        return None
+    # Each download starts as soon as its URL arrives instead of waiting for every generation to finish.
+    async with download_slots:
+        print(f"Downloading image for scene {scene['scene_number']}")
+        with span("image.download", scene=scene['scene_number']):
+            return await fetch_and_save_image_async(client, image_url, f"image{scene['scene_number']}", output_dir)
+
+
+async def acquire_scene_images(scenes, workspace, client=None):
+    image_slots = asyncio.Semaphore(IMAGE_CONCURRENCY)
+    download_slots = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+
+    async def acquire(http_client, scene):
+        return await acquire_scene_image(http_client, scene, workspace.images_dir, image_slots, download_slots)
+
+    if client is not None:
+        paths = await asyncio.gather(*(acquire(client, scene) for scene in scenes))
+    else:
+        async with create_http_client() as http_client:
+            paths = await asyncio.gather(*(acquire(http_client, scene) for scene in scenes))
+    return {scene['scene_number']: path for scene, path in zip(scenes, paths)}
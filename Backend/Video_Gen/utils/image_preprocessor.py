@@ -0,0 +1,142 @@
+import os
+import re
+import uuid
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+TARGET_SIZE = (1080, 1920)
+PREPROCESS_CACHE_DIR = os.environ.get("PREPROCESS_CACHE_DIR", os.path.join(".cache", "letterbox"))
+PREPROCESS_CACHE_MAX_MB = int(os.environ.get("PREPROCESS_CACHE_MAX_MB", 2048))
+PREPROCESS_FORMAT = os.environ.get("PREPROCESS_FORMAT", "png")
+PREPROCESS_HANDOFF = os.environ.get("PREPROCESS_HANDOFF", "file")
+PREPROCESS_WORKERS = int(os.environ.get("PREPROCESS_WORKERS", os.cpu_count() or 1))
+JPEG_QUALITY = int(os.environ.get("PREPROCESS_JPEG_QUALITY", 90))
+# zlib level 1 is lossless and several times faster to write than Pillow's default of 6.
+PNG_COMPRESS_LEVEL = 1
+
+IMAGE_EXTENSIONS = {"png": ".png", "jpeg": ".jpg"}
+SOURCE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def scene_number_from_filename(filename):
+    match = re.search(r"(\d+)", os.path.splitext(filename)[0])
+    return int(match.group(1)) if match else None
+
+
+def cache_key(source_bytes, target_size, fmt):
+    digest = hashlib.sha256(source_bytes)
+    digest.update(f"\0{target_size[0]}x{target_size[1]}\0{fmt}".encode())
+    return digest.hexdigest()
+
+
+def letterbox(img, target_size=TARGET_SIZE):
+    target_width, target_height = target_size
+    scale_ratio = min(target_width / img.width, target_height / img.height)
+    new_size = (max(1, int(img.width * scale_ratio)), max(1, int(img.height * scale_ratio)))
+    # JPEG sources can be decoded straight at 1/2, 1/4 or 1/8 scale, which skips most of the IDCT work.
+    img.draft('RGB', new_size)
+    img = img.convert('RGB')
+    factor = min(img.width // new_size[0], img.height // new_size[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+    img = img.resize(new_size, Image.Resampling.LANCZOS)
+    canvas = Image.new('RGB', target_size, (0, 0, 0))
+    canvas.paste(img, ((target_width - new_size[0]) // 2, (target_height - new_size[1]) // 2))
+    return canvas
+
+
+def save_image(img, path, fmt=PREPROCESS_FORMAT):
+    # Threads of one process can letterbox the same image at once, so the pid alone isn't unique.
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    if fmt == "png":
+        img.save(tmp_path, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    else:
+        img.save(tmp_path, format="JPEG", quality=JPEG_QUALITY)
+    os.replace(tmp_path, path)
+
+
+def link_or_copy(src, dst):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        with open(src, 'rb') as f_src, open(dst, 'wb') as f_dst:
+            f_dst.write(f_src.read())
+
+
+def prune_cache(cache_dir=PREPROCESS_CACHE_DIR, max_bytes=PREPROCESS_CACHE_MAX_MB * 1024 * 1024):
+    """Remove the least recently used letterboxed images until the cache fits in max_bytes.
+
+    Pool workers can't share an in-memory index, so this scans the directory once per job instead; a cache hit
+    touches its file, which makes the mtime order the LRU order.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    if removed:
+        print(f"Evicted {removed} letterboxed images from {cache_dir}")
+    return removed
+
+
+def preprocess_image(input_path, output_path=None, target_size=TARGET_SIZE, fmt=PREPROCESS_FORMAT, cache_dir=PREPROCESS_CACHE_DIR):
+    """Letterbox one image. Writes it to output_path, or returns raw rgb24 bytes when output_path is None."""
+    with open(input_path, 'rb') as f:
+        source_bytes = f.read()
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_path = os.path.join(cache_dir, cache_key(source_bytes, target_size, fmt) + IMAGE_EXTENSIONS[fmt])
+
+    img = None
+    if not os.path.exists(cached_path):
+        with Image.open(input_path) as source:
+            img = letterbox(source, target_size)
+        save_image(img, cached_path, fmt)
+    else:
+        os.utime(cached_path)
+
+    if output_path is not None:
+        link_or_copy(cached_path, output_path)
+        return output_path
+    if img is None:
+        with Image.open(cached_path) as cached:
+            img = cached.convert('RGB')
+    return img.tobytes()
+
+
+def preprocess_images(input_dir, output_dir, handoff=PREPROCESS_HANDOFF, fmt=PREPROCESS_FORMAT, workers=PREPROCESS_WORKERS):
+    """Letterbox every scene image in input_dir on a process pool.
+
+    Returns {scene_number: path} for the file handoff, or {scene_number: rgb24 bytes} for the raw handoff.
+    """
+    prune_cache()
+    jobs = {}
+    for filename in os.listdir(input_dir):
+        scene_number = scene_number_from_filename(filename)
+        if filename.lower().endswith(SOURCE_EXTENSIONS) and scene_number is not None:
+            input_path = os.path.join(input_dir, filename)
+            output_path = os.path.join(output_dir, f"image{scene_number}{IMAGE_EXTENSIONS[fmt]}") if handoff == "file" else None
+            jobs[scene_number] = (input_path, output_path, TARGET_SIZE, fmt)
+    if handoff == "file":
+        os.makedirs(output_dir, exist_ok=True)
+
+    if workers <= 1 or len(jobs) <= 1:
+        return {scene_number: preprocess_image(*args) for scene_number, args in sorted(jobs.items())}
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        futures = {scene_number: executor.submit(preprocess_image, *args) for scene_number, args in sorted(jobs.items())}
+        return {scene_number: future.result() for scene_number, future in futures.items()}
@@ -0,0 +1,80 @@
+BITRATES_KBPS = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+
+def skip_id3v2(data):
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def parse_frame_header(data, offset):
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    version_bits = (data[offset + 1] >> 3) & 0x03
+    layer_bits = (data[offset + 1] >> 1) & 0x03
+    bitrate_index = data[offset + 2] >> 4
+    sample_rate_index = (data[offset + 2] >> 2) & 0x03
+    padding = (data[offset + 2] >> 1) & 0x01
+    channel_mode = data[offset + 3] >> 6
+    # Only Layer III is handled, which is what every TTS provider we use returns.
+    if version_bits == 1 or layer_bits != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version_bits == 3
+    bitrate = BITRATES_KBPS[1 if mpeg1 else 2][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version_bits][sample_rate_index]
+    samples_per_frame = 1152 if mpeg1 else 576
+    frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    side_info = (32 if channel_mode != 3 else 17) if mpeg1 else (17 if channel_mode != 3 else 9)
+    return frame_length, samples_per_frame, sample_rate, side_info
+
+
+def xing_frame_count(data, offset, side_info):
+    tag_offset = offset + 4 + side_info
+    if data[tag_offset:tag_offset + 4] in (b'Xing', b'Info'):
+        flags = int.from_bytes(data[tag_offset + 4:tag_offset + 8], 'big')
+        if flags & 0x01:
+            return int.from_bytes(data[tag_offset + 8:tag_offset + 12], 'big')
+    vbri_offset = offset + 4 + 32
+    if data[vbri_offset:vbri_offset + 4] == b'VBRI':
+        return int.from_bytes(data[vbri_offset + 14:vbri_offset + 18], 'big')
+    return None
+
+
+def mp3_duration_from_bytes(data):
+    offset = skip_id3v2(data)
+    total_samples = 0
+    sample_rate = None
+    first_frame = True
+    while offset + 4 <= len(data):
+        header = parse_frame_header(data, offset)
+        if header is None:
+            offset += 1
+            continue
+        frame_length, samples_per_frame, frame_sample_rate, side_info = header
+        if first_frame:
+            first_frame = False
+            # A Xing/Info/VBRI header frame carries the frame count, so VBR files don't need a full scan.
+            frame_count = xing_frame_count(data, offset, side_info)
+            if frame_count:
+                return frame_count * samples_per_frame / frame_sample_rate
+        sample_rate = frame_sample_rate
+        total_samples += samples_per_frame
+        offset += frame_length
+    if sample_rate is None:
+        raise ValueError("No MPEG audio frames found")
+    return total_samples / sample_rate
+
+
+def mp3_duration(audio_path):
+    with open(audio_path, 'rb') as f:
+        return mp3_duration_from_bytes(f.read())
@@ -0,0 +1,159 @@
+import os
+import re
+import json
+import asyncio
+import hashlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR", os.path.join(".cache", "pdf_text"))
+PDF_INGEST_WORKERS = int(os.environ.get("PDF_INGEST_WORKERS", os.cpu_count() or 1))
+PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", 16))
+CHUNK_CHARS = int(os.environ.get("PDF_CHUNK_CHARS", 12000))
+SUMMARY_CONCURRENCY = int(os.environ.get("PDF_SUMMARY_CONCURRENCY", 4))
+MAX_REDUCE_ROUNDS = 3
+# Lines that open or close at least this share of the sampled pages are treated as running headers/footers.
+BOILERPLATE_EDGE_LINES = 2
+BOILERPLATE_MIN_SHARE = 0.5
+BOILERPLATE_SAMPLE_PAGES = 24
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _extract_page_range(pdf_path, start, stop):
+    with fitz.open(pdf_path) as doc:
+        return [doc.load_page(page_num).get_text("text") for page_num in range(start, stop)]
+
+
+def iter_raw_pages(pdf_path, workers=PDF_INGEST_WORKERS, pages_per_task=PAGES_PER_TASK):
+    """Yield page texts in order while later page ranges are still being extracted."""
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+    if workers <= 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            yield from _extract_page_range(pdf_path, start, stop)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        futures = [executor.submit(_extract_page_range, pdf_path, start, stop) for start, stop in ranges]
+        for future in futures:
+            yield from future.result()
+
+
+def _line_signature(line):
+    # Page numbers change from page to page, so digits are ignored when matching running headers and footers.
+    return re.sub(r"\d+", "#", line.strip().lower())
+
+
+def _edge_lines(text):
+    lines = [line for line in text.splitlines() if line.strip()]
+    # Short pages only offer their first and last line, so body text is never mistaken for a header.
+    edge = min(BOILERPLATE_EDGE_LINES, len(lines) // 3)
+    return lines[:edge] + lines[-edge:] if edge else []
+
+
+def find_boilerplate(pages):
+    if len(pages) < 3:
+        return set()
+    counts = Counter(signature for page in pages for signature in {_line_signature(line) for line in _edge_lines(page)})
+    return {signature for signature, count in counts.items() if signature and count / len(pages) >= BOILERPLATE_MIN_SHARE}
+
+
+def strip_boilerplate(text, boilerplate):
+    lines = text.splitlines()
+    edges = set(_edge_lines(text))
+    return "\n".join(line for line in lines if not (line in edges and _line_signature(line) in boilerplate)).strip()
+
+
+def iter_clean_pages(pdf_path, workers=PDF_INGEST_WORKERS):
+    """Stream de-boilerplated pages. Headers/footers are learned from the first BOILERPLATE_SAMPLE_PAGES pages."""
+    sample = []
+    boilerplate = None
+    for page in iter_raw_pages(pdf_path, workers):
+        if boilerplate is None:
+            sample.append(page)
+            if len(sample) < BOILERPLATE_SAMPLE_PAGES:
+                continue
+            boilerplate = find_boilerplate(sample)
+            yield from (strip_boilerplate(sampled, boilerplate) for sampled in sample)
+            continue
+        yield strip_boilerplate(page, boilerplate)
+    if boilerplate is None:
+        boilerplate = find_boilerplate(sample)
+        yield from (strip_boilerplate(sampled, boilerplate) for sampled in sample)
+
+
+def stream_pdf_pages(pdf_path, workers=PDF_INGEST_WORKERS, cache_dir=PDF_CACHE_DIR):
+    """Yield cleaned page texts, from the cache when this exact file was extracted before."""
+    cache_path = os.path.join(cache_dir, f"{file_hash(pdf_path)}.json")
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            yield from json.load(f)
+        return
+    except (OSError, ValueError):
+        pass
+
+    pages = []
+    for page in iter_clean_pages(pdf_path, workers):
+        pages.append(page)
+        yield page
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pages, f)
+    os.replace(tmp_path, cache_path)
+
+
+def extract_pdf_text(pdf_path, workers=PDF_INGEST_WORKERS):
+    return "\n\n".join(page for page in stream_pdf_pages(pdf_path, workers) if page)
+
+
+def iter_chunks(pages, chunk_chars=CHUNK_CHARS):
+    """Group a stream of pages into chunks of at most chunk_chars, splitting on paragraph boundaries."""
+    parts = []
+    size = 0
+    for page in pages:
+        for paragraph in re.split(r"\n\s*\n", page):
+            paragraph = paragraph.strip()
+            while paragraph:
+                piece, paragraph = paragraph[:chunk_chars], paragraph[chunk_chars:]
+                if size + len(piece) > chunk_chars and parts:
+                    yield "\n\n".join(parts)
+                    parts, size = [], 0
+                parts.append(piece)
+                size += len(piece) + 2
+    if parts:
+        yield "\n\n".join(parts)
+
+
+async def map_reduce(chunks, summarize, chunk_chars=CHUNK_CHARS, concurrency=SUMMARY_CONCURRENCY):
+    """Summarize each chunk with `summarize` (an async str -> str callable), then condense the summaries until they fit one chunk.
+
+    `chunks` may be a plain iterator, such as iter_chunks over stream_pdf_pages, so summaries start before extraction finishes.
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def summarize_chunk(chunk):
+        async with slots:
+            return await summarize(chunk)
+
+    iterator = iter(chunks)
+    tasks = []
+    while (chunk := await asyncio.to_thread(next, iterator, None)) is not None:
+        tasks.append(asyncio.create_task(summarize_chunk(chunk)))
+    summaries = await asyncio.gather(*tasks)
+
+    combined = "\n\n".join(summaries)
+    for _ in range(MAX_REDUCE_ROUNDS):
+        if len(combined) <= chunk_chars or len(summaries) <= 1:
+            break
+        summaries = await asyncio.gather(*(summarize_chunk(chunk) for chunk in iter_chunks([combined], chunk_chars)))
+        combined = "\n\n".join(summaries)
+    return combined
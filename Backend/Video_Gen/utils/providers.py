@@ -0,0 +1,14 @@
+"""Provider limits for OpenAI chat and images, the image CDN and Deepgram; the budget itself is common/providers.py."""
+from common.providers import Provider, ProviderRegistry, estimate_tokens
+
+# name: (requests/min, tokens/min, initial concurrency, max concurrency, hedge); 0 means unlimited.
+PROVIDER_DEFAULTS = {
+    "openai_chat": (500, 200_000, 4, 16, False),
+    "openai_images": (50, 0, 5, 10, False),
+    "image_cdn": (0, 0, 10, 32, True),
+    "deepgram": (480, 0, 5, 20, False),
+}
+
+providers = ProviderRegistry(PROVIDER_DEFAULTS)
+get_provider = providers.get
+provider_stats = providers.stats
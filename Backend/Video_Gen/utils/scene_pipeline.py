@@ -0,0 +1,108 @@
+import os
+import asyncio
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .image_pipeline import DOWNLOAD_CONCURRENCY, IMAGE_CONCURRENCY, acquire_scene_image, create_http_client
+from .image_preprocessor import PREPROCESS_FORMAT, PREPROCESS_HANDOFF, PREPROCESS_WORKERS, TARGET_SIZE, preprocess_image, prune_cache
+from .subtitles_generator import TTS_CONCURRENCY, build_scene_timeline, remove_emojis_and_special_chars, write_scene_manifest, write_srt_file
+from .tts import create_audio_and_get_duration_async
+from .tracing import span, traced_call
+from .hls import HLSWriter
+from .video_generator import BG_MUSIC_PATH, BG_MUSIC_VOLUME, ENCODER_PROFILE, ENCODER_THREADS, SCENE_ENCODE_WORKERS, encode_scene, join_scene_segments, scene_image_path
+
+
+async def render_scenes_streaming(scenes, workspace, client=None, handoff=PREPROCESS_HANDOFF, workers=SCENE_ENCODE_WORKERS, profile=ENCODER_PROFILE, output_format="mp4"):
+    """Run every scene as its own chain (image -> download -> letterbox, TTS -> duration -> encode).
+
+    A scene is encoded as soon as its own image and narration are ready; joining the segments is the only
+    step that waits for every scene. With output_format="hls" there is no join: each scene is appended to
+    workspace.hls_dir's live playlist as soon as it and the scenes before it are encoded.
+    Returns the subtitle timeline of the scenes that made it into the video.
+    """
+    scenes = [{**scene, "text": remove_emojis_and_special_chars(scene["text"])} for scene in scenes]
+    last_scene = scenes[-1]["scene_number"]
+    image_slots = asyncio.Semaphore(IMAGE_CONCURRENCY)
+    download_slots = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+    tts_slots = asyncio.Semaphore(TTS_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    if handoff == "file":
+        os.makedirs(workspace.processed_dir, exist_ok=True)
+    await asyncio.to_thread(prune_cache)
+    hls_writer = HLSWriter(workspace.hls_dir, [scene["scene_number"] for scene in scenes], background_music=BG_MUSIC_PATH, music_volume=BG_MUSIC_VOLUME) if output_format == "hls" else None
+
+    async def prepare_image(http_client, scene, letterbox_pool):
+        source_path = await acquire_scene_image(http_client, scene, workspace.images_dir, image_slots, download_slots)
+        if source_path is None:
+            return None
+        output_path = scene_image_path(workspace.processed_dir, scene["scene_number"]) if handoff == "file" else None
+        try:
+            with span("image.preprocess", handoff=handoff):
+                return await loop.run_in_executor(letterbox_pool, preprocess_image, source_path, output_path, TARGET_SIZE, PREPROCESS_FORMAT)
+        except Exception as e:
+            # A corrupt or non-image download can fail in any number of ways inside Pillow; like a failed encode, it only costs this scene.
+            print(f"Preprocessing the image of scene {scene['scene_number']} failed, skipping it: {e}")
+            return None
+
+    async def narrate(http_client, scene):
+        async with tts_slots:
+            print(f"Generating audio for scene {scene['scene_number']}")
+            return await create_audio_and_get_duration_async(http_client, scene["text"], scene["scene_number"], workspace.audio_dir)
+
+    async def render_scene(http_client, scene, letterbox_pool, encode_pool):
+        scene_number = scene["scene_number"]
+        with span("scene", scene=scene_number):
+            image, duration = await asyncio.gather(prepare_image(http_client, scene, letterbox_pool), narrate(http_client, scene))
+            if image is None or not duration:
+                print(f"Missing image or audio for scene {scene_number}, skipping it")
+                return None, None
+            print(f"Scene {scene_number} inputs ready ({duration:.2f}s), encoding")
+            try:
+                segment = await loop.run_in_executor(encode_pool, traced_call(
+                    encode_scene,
+                    scene_number,
+                    image if handoff == "file" else None,
+                    os.path.join(workspace.audio_dir, f"scene{scene_number}.mp3"),
+                    duration,
+                    scene["text"],
+                    workspace.temp_scene_path(scene_number),
+                    scene_number == last_scene,
+                    profile,
+                    ENCODER_THREADS,
+                    image if handoff == "raw" else None,
+                    hls_writer.segment_seconds if hls_writer else None,
+                ))
+            except (subprocess.CalledProcessError, OSError) as e:
+                # Like a missing image or narration, a failed encode drops just this scene; the others keep their work.
+                print(f"Encoding scene {scene_number} failed, skipping it: {getattr(e, 'stderr', None) or e}")
+                return None, None
+            return segment, duration
+
+    async def render_and_stream(http_client, scene, letterbox_pool, encode_pool):
+        segment, duration = await render_scene(http_client, scene, letterbox_pool, encode_pool)
+        if hls_writer:
+            with span("hls.segment", scene=scene["scene_number"]):
+                await asyncio.to_thread(hls_writer.add, scene["scene_number"], segment)
+        return segment, duration
+
+    async def render_all(http_client):
+        with ProcessPoolExecutor(max_workers=PREPROCESS_WORKERS) as letterbox_pool, ThreadPoolExecutor(max_workers=workers) as encode_pool:
+            return await asyncio.gather(*(render_and_stream(http_client, scene, letterbox_pool, encode_pool) for scene in scenes))
+
+    if client is not None:
+        results = await render_all(client)
+    else:
+        async with create_http_client(IMAGE_CONCURRENCY + DOWNLOAD_CONCURRENCY + TTS_CONCURRENCY) as http_client:
+            results = await render_all(http_client)
+
+    segments = [segment for segment, _ in results if segment]
+    if not segments:
+        raise Exception("No scenes to encode")
+    timeline = build_scene_timeline(scenes, [duration for _, duration in results], workspace.audio_dir)
+    write_srt_file(timeline, workspace.srt_path)
+    write_scene_manifest(timeline, workspace.manifest_path)
+    if hls_writer:
+        await asyncio.to_thread(hls_writer.finish)
+    else:
+        await asyncio.to_thread(join_scene_segments, segments, workspace)
+    return timeline
@@ -1,5 +1,11 @@
+import os
 import re
-from .tts import generate_audio
+import json
+import asyncio
+import httpx
+from .tts import create_audio_and_get_duration_async
+
+TTS_CONCURRENCY = int(os.environ.get("TTS_CONCURRENCY", 5))
 
 def convert_seconds_to_srt_timestamp(seconds):
     milliseconds = int((seconds - int(seconds)) * 1000)
@@ -26,36 +32,67 @@ def remove_emojis_and_special_chars(text):
     text = re.sub(r'[^A-Za-z0-9\s.,?!-]', '', text)
     return text
 
-def create_srt_file_from_json_data(json_output, output_srt_path="subtitles.srt"):
-    try:
-        subtitles = []
-        current_time = 0.0
-
-        for item in json_output:
-            scene_number = item["scene_number"]
-            text = item["text"]
+def build_scene_timeline(scenes, durations, audio_dir):
+    timeline = []
+    current_time = 0.0
+    for scene, duration in zip(scenes, durations):
+        if not duration:
+            continue
+        timeline.append({
+            "scene_number": scene["scene_number"],
+            "text": scene["text"],
+            "audio_path": os.path.join(audio_dir, f"scene{scene['scene_number']}.mp3"),
+            "duration": duration,
+            "start": current_time,
+            "end": current_time + duration,
+        })
+        current_time += duration
+    return timeline
 
-            text = remove_emojis_and_special_chars(text)
+def write_srt_file(timeline, output_srt_path):
+    subtitles = []
+    for entry in timeline:
+        subtitles.append(f"{entry['scene_number']}")
+        subtitles.append(f"{convert_seconds_to_srt_timestamp(entry['start'])} --> {convert_seconds_to_srt_timestamp(entry['end'])}")
+        subtitles.append(entry["text"])
+        subtitles.append("")
+    with open(output_srt_path, "w", encoding="utf-8") as srt_file:
+        srt_file.write("\n".join(subtitles))
 
-            print(f"Generating audio for scene {scene_number}")
-            duration = generate_audio(text, scene_number)
+def write_scene_manifest(timeline, manifest_path):
+    with open(manifest_path, "w", encoding="utf-8") as manifest_file:
+        json.dump({"scenes": timeline, "total_duration": timeline[-1]["end"] if timeline else 0.0}, manifest_file, indent=2)
 
-            start_time = current_time if duration else current_time
-            end_time = current_time + duration if duration else current_time
+def load_scene_manifest(manifest_path):
+    try:
+        with open(manifest_path, encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
 
-            start_time_formatted = convert_seconds_to_srt_timestamp(start_time) if duration else ""
-            end_time_formatted = convert_seconds_to_srt_timestamp(end_time) if duration else ""
+async def create_srt_file_and_manifest(json_output, workspace, client=None):
+    try:
+        scenes = [{**item, "text": remove_emojis_and_special_chars(item["text"])} for item in json_output]
+        slots = asyncio.Semaphore(TTS_CONCURRENCY)
 
-            subtitles.append(f"{scene_number}") if duration else None
-            subtitles.append(f"{start_time_formatted} --> {end_time_formatted}") if duration else None
-            subtitles.append(text) if duration else None
-            subtitles.append("") if duration else None
+        async def synthesize(http_client, scene):
+            async with slots:
+                print(f"Generating audio for scene {scene['scene_number']}")
+                return await create_audio_and_get_duration_async(http_client, scene["text"], scene["scene_number"], workspace.audio_dir)
 
-            current_time = end_time if duration else current_time
+        if client is not None:
+            durations = await asyncio.gather(*(synthesize(client, scene) for scene in scenes))
+        else:
+            async with httpx.AsyncClient(timeout=60.0, limits=httpx.Limits(max_connections=TTS_CONCURRENCY)) as http_client:
+                durations = await asyncio.gather(*(synthesize(http_client, scene) for scene in scenes))
 
-        with open(output_srt_path, "w", encoding="utf-8") as srt_file:
-            srt_file.write("\n".join(subtitles))
-        print(f"SRT file generated successfully: {output_srt_path}")
+        # The timeline is only computed once every scene's duration is known, whatever order they finished in.
+        timeline = build_scene_timeline(scenes, durations, workspace.audio_dir)
+        write_srt_file(timeline, workspace.srt_path)
+        write_scene_manifest(timeline, workspace.manifest_path)
+        print(f"SRT file generated successfully: {workspace.srt_path}")
+        return timeline
 
     except Exception as e:
         print(f"Error generating SRT file: {e}")
+        return []
@@ -0,0 +1,5 @@
+"""Tracing settings for Video_Gen: VIDEO_TRACE_FILE and VIDEO_TRACE_OTEL. The spans themselves are common/tracing.py."""
+from common import tracing
+from common.tracing import metrics, record_usage, span, traced_call
+
+tracing.configure("video_gen", "VIDEO", ("job_id", "scene", "attempt"))
@@ -1,14 +1,17 @@
 import os
-import requests
 import subprocess
 
-url = "https://api.deepgram.com/v1/speak?model=aura-luna-en"
+from .mp3_duration import mp3_duration
+from .providers import get_provider
+from .tracing import span
+
+url = os.environ.get("DEEPGRAM_SPEAK_URL", "https://api.deepgram.com/v1/speak?model=aura-luna-en")
 headers = {
     'Authorization': f'Token {os.environ.get("DEEPGRAM_API_KEY")}',
     'Content-Type': 'text/plain'
 }
 
-def fetch_audio_duration(audio_path):
+def fetch_audio_duration_ffprobe(audio_path):
     try:
         command = [
             "ffprobe", "-i", audio_path,
@@ -22,19 +25,26 @@ def fetch_audio_duration(audio_path):
         print(f"Error getting audio duration: {e}")
         return 0
 
-def create_audio_and_get_duration(text, scene):
-    return None if not text or not scene else _create_audio_and_get_duration(text, scene)
+def fetch_audio_duration(audio_path):
+    with span("audio.duration", method="mp3_headers") as current:
+        try:
+            return mp3_duration(audio_path)
+        except (OSError, ValueError) as e:
+            print(f"Could not read MP3 frame headers of {audio_path} ({e}), falling back to ffprobe")
+            current.set(method="ffprobe")
+            return fetch_audio_duration_ffprobe(audio_path)
 
-def _create_audio_and_get_duration(text, scene):
-    os.makedirs('audios', exist_ok=True)
-    response = requests.request("POST", url, headers=headers, data=text)
-    if response.status_code == 200:
-        audio_path = f'audios/scene{scene}.mp3'
-        with open(audio_path, 'wb') as f:
-            f.write(response.content)
-        print(f"Audio file saved successfully as '{audio_path}'")
-        duration = fetch_audio_duration(audio_path)
-        return duration
-    else:
+async def create_audio_and_get_duration_async(client, text, scene, audio_dir='audios'):
+    if not text or not scene:
+        return None
+    os.makedirs(audio_dir, exist_ok=True)
+    with span("tts", scene=scene, chars=len(text)):
+        response = await get_provider("deepgram").call(lambda: client.post(url, headers=headers, content=text.encode('utf-8')))
+    if response.status_code != 200:
         print(f"Error: {response.text}")
         return None
+    audio_path = os.path.join(audio_dir, f'scene{scene}.mp3')
+    with open(audio_path, 'wb') as f:
+        f.write(response.content)
+    print(f"Audio file saved successfully as '{audio_path}'")
+    return fetch_audio_duration(audio_path)
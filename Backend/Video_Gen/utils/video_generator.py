@@ -1,8 +1,12 @@
 import os
 import subprocess
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 import pysrt
 
+from .subtitles_generator import load_scene_manifest
+from .tracing import span, traced_call
+from .image_preprocessor import IMAGE_EXTENSIONS, PREPROCESS_FORMAT, PREPROCESS_HANDOFF, preprocess_images
+
 FONT_SIZE = 50
 FONT_COLOR = "white"
 FONT = "Arial"
@@ -13,6 +17,23 @@ SUBTITLE_BOTTOM_GAP = 60
 SUBTITLE_MARGIN = 30
 SUBTITLE_VERTICAL_ALIGNMENT = "bottom"
 ADD_SUBTITLES = True
+VIDEO_WIDTH = 1080
+VIDEO_HEIGHT = 1920
+FRAME_RATE = 30
+WATERMARK_PATH = "watermark_100Agents.png"
+WATERMARK_PADDING_TOP = 30
+BG_MUSIC_PATH = "bg_music.mp3"
+BG_MUSIC_VOLUME = 0.1
+SINGLE_PASS_MAX_SCENES = int(os.environ.get("SINGLE_PASS_MAX_SCENES", 12))
+
+ENCODER_PROFILES = {
+    "fast": {"preset": "veryfast", "crf": "23"},
+    "balanced": {"preset": "medium", "crf": "21"},
+    "small": {"preset": "slow", "crf": "25"},
+}
+ENCODER_PROFILE = os.environ.get("ENCODER_PROFILE", "balanced")
+ENCODER_THREADS = int(os.environ.get("ENCODER_THREADS", 2))
+SCENE_ENCODE_WORKERS = int(os.environ.get("SCENE_ENCODE_WORKERS", max(1, (os.cpu_count() or 1) // ENCODER_THREADS)))
 
 def extract_subtitle_texts_from_srt(srt_file):
     try:
@@ -46,33 +67,14 @@ def get_subtitle_vertical_position(total_lines, font_size, line_spacing, video_h
     margin = SUBTITLE_MARGIN
     return margin if alignment == "top" else (video_height - total_height) // 2 if alignment == "center" else video_height - total_height - margin - SUBTITLE_BOTTOM_GAP if alignment == "bottom" else (_ for _ in ()).throw(ValueError("Invalid subtitle alignment"))
 
-def fit_image_to_vertical_16_9(input_path, output_path):
-    img = Image.open(input_path)
-    width, height = img.size
-    target_width = 1080
-    target_height = 1920
-    width_ratio = target_width / width
-    height_ratio = target_height / height
-    scale_ratio = min(width_ratio, height_ratio)
-    new_width = int(width * scale_ratio)
-    new_height = int(height * scale_ratio)
-    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-    new_img = Image.new('RGB', (target_width, target_height), (0, 0, 0))
-    paste_x = (target_width - new_width) // 2
-    paste_y = (target_height - new_height) // 2
-    new_img.paste(img, (paste_x, paste_y))
-    new_img.save(output_path, quality=100)
-
-def prepare_images_for_ffmpeg(input_dir, output_dir):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    image_count = 1
-    for filename in sorted(os.listdir(input_dir)):
-        if filename.endswith((".jpg", ".jpeg", ".png")):
-            input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, f"image{image_count}.jpg")
-            fit_image_to_vertical_16_9(input_path, output_path) if not os.path.exists(output_path) else None
-            image_count += 1
+def prepare_images_for_ffmpeg(workspace, handoff=PREPROCESS_HANDOFF):
+    with span("image.preprocess", handoff=handoff) as current:
+        prepared = preprocess_images(workspace.images_dir, workspace.processed_dir, handoff)
+        current.set(images=len(prepared))
+        return prepared
+
+def scene_image_path(output_dir, scene_number):
+    return os.path.join(output_dir, f"image{scene_number}{IMAGE_EXTENSIONS[PREPROCESS_FORMAT]}")
 
 def fetch_audio_duration_ffmpeg(audio_path):
     try:
@@ -92,7 +94,7 @@ def fetch_audio_duration_ffmpeg(audio_path):
         print(f"Error getting audio duration: {e}")
         return None
 
-def build_subtitle_filter(wrapped_subtitles, audio_duration):
+def build_subtitle_filter(wrapped_subtitles, audio_duration, start_time=0):
     if not wrapped_subtitles:
         return "null"
     filter_complex = []
@@ -109,106 +111,208 @@ def build_subtitle_filter(wrapped_subtitles, audio_duration):
             f"font='{FONT}':"
             f"box=1:boxcolor=black@0.5:boxborderw=5:"
             f"x={SUBTITLE_X_POSITION}:y={y_position}:line_spacing={line_spacing}:"
-            f"fix_bounds=true:enable='between(t,0,{audio_duration})'"
+            f"fix_bounds=true:enable='between(t,{start_time},{start_time + audio_duration})'"
         )
     return ','.join(filter_complex)
 
-def generate_video_with_audio_and_subtitles(output_dir, audio_dir, output_video):
-    try:
-        watermark_path = "watermark_100Agents.png"
-        watermark_exists = os.path.exists(watermark_path)
-        watermark_padding_top = 30
-        base_dir = os.getcwd()
-        concat_list_path = os.path.join(base_dir, "concat_list.txt")
-        subtitles = extract_subtitle_texts_from_srt('subtitles.srt')
-        audio_files = [f for f in sorted(os.listdir(audio_dir)) if f.endswith('.mp3')]
-        scene_count = len(audio_files)
-        total_duration = sum(fetch_audio_duration_ffmpeg(os.path.join(audio_dir, f"scene{i}.mp3")) for i in range(1, len(subtitles) + 1))
-        with open(concat_list_path, "w", encoding='utf-8') as f:
-            print(f"Found {scene_count} audio files")
-            for i in range(1, scene_count + 1):
-                image_path = os.path.join(output_dir, f"image{i}.jpg")
-                audio_path = os.path.join(audio_dir, f"scene{i}.mp3")
-                temp_video = os.path.join(base_dir, f"temp_scene_{i}.mp4")
-                if not (os.path.exists(image_path) and os.path.exists(audio_path)):
-                    print(f"Missing files for scene {i}")
-                    continue
-                audio_duration = fetch_audio_duration_ffmpeg(audio_path)
-                if audio_duration is None:
-                    print(f"Could not determine duration for {audio_path}")
-                    continue
-                print(f"Processing scene {i} with duration {audio_duration} seconds")
-                subtitle_text = subtitles[i - 1] if ADD_SUBTITLES and i - 1 < len(subtitles) else ""
-                wrapped_subtitles = wrap_text_for_subtitles(subtitle_text, max_width=1080 - 40) if ADD_SUBTITLES else []
-                print(f"Wrapped subtitles for scene {i}: {wrapped_subtitles}") if ADD_SUBTITLES else None
-                subtitle_filter = build_subtitle_filter(wrapped_subtitles, audio_duration) if ADD_SUBTITLES else "null"
-                bg_music_path = "bg_music.mp3"
-                bg_music_exists = os.path.exists(bg_music_path)
-                command = [
-                    "ffmpeg", "-y",
-                    "-loop", "1",
-                    "-t", str(audio_duration),
-                    "-i", image_path,
-                    "-i", audio_path
-                ]
-                if watermark_exists:
-                    command += ["-i", watermark_path, "-filter_complex",
-                        f"[0][2]overlay=(W-w)/2:{watermark_padding_top}[bg]; [bg]{subtitle_filter},fade=t=in:st=0:d=1,fade=t=out:st={total_duration-0.5}:d=0.5"]
-                else:
-                    command += ["-filter_complex",
-                        f"{subtitle_filter},fade=t=in:st=0:d=1,fade=t=out:st={total_duration-0.5}:d=0.5"]
-                command += [
-                    "-pix_fmt", "yuv420p",
-                    "-shortest",
-                    "-avoid_negative_ts", "make_zero",
-                    "-r", "30",
-                    temp_video
-                ]
-                print(f"Creating scene {i} with watermark & timed subtitles..." if ADD_SUBTITLES else f"Creating scene {i} without subtitles")
-                subprocess.run(command, check=True)
-                f.write(f"file '{os.path.abspath(temp_video)}'\n")
-        if not os.path.exists(concat_list_path):
-            raise Exception("Concat list file was not created")
-        with open(concat_list_path, 'r') as f:
-            content = f.read().strip()
-            if not content:
-                raise Exception("Concat list file is empty")
-            print("Concat file content:")
-            print(content)
-        bg_music_path = "bg_music.mp3"
-        bg_music_exists = os.path.exists(bg_music_path)
-        filter_complex_str = (
-            f"[0:v]fade=t=in:st=0:d=1,fade=t=out:st={total_duration-0.5}:d=0.5[v]; "
-            if bg_music_exists else
-            f"[0:v]fade=t=in:st=0:d=1,fade=t=out:st={total_duration-0.5}:d=0.5[v]; [0:a]anull[a]"
-        )
-        final_command = [
-            "ffmpeg", "-y",
-            "-f", "concat",
-            "-safe", "0",
-            "-i", concat_list_path,
-            "-map", "[v]",
-            "-c:a", "aac",
-            "-pix_fmt", "yuv420p",
-            "-shortest",
-            output_video
+def encoder_options(profile=ENCODER_PROFILE, threads=ENCODER_THREADS, keyframe_seconds=None):
+    settings = ENCODER_PROFILES[profile]
+    options = [
+        "-c:v", "libx264", "-preset", settings["preset"], "-crf", settings["crf"],
+        "-threads", str(threads),
+        "-pix_fmt", "yuv420p", "-r", str(FRAME_RATE),
+        "-c:a", "aac", "-ar", "44100", "-ac", "2", "-b:a", "128k",
+    ]
+    # Regular keyframes let the HLS segmenter cut a stream-copied scene into segments of the requested length.
+    return options + (["-force_key_frames", f"expr:gte(t,n_forced*{keyframe_seconds})"] if keyframe_seconds else [])
+
+def encode_scene(i, image_path, audio_path, audio_duration, subtitle_text, temp_video, is_last, profile=ENCODER_PROFILE, threads=ENCODER_THREADS, frame=None, keyframe_seconds=None):
+    wrapped_subtitles = wrap_text_for_subtitles(subtitle_text, max_width=VIDEO_WIDTH - 40) if ADD_SUBTITLES else []
+    print(f"Wrapped subtitles for scene {i}: {wrapped_subtitles}") if ADD_SUBTITLES else None
+    subtitle_filter = build_subtitle_filter(wrapped_subtitles, audio_duration) if ADD_SUBTITLES else "null"
+    # Fades live in the scene segments so the final join can be a plain stream copy.
+    fades = "fade=t=in:st=0:d=1" + (f",fade=t=out:st={max(audio_duration - 0.5, 0)}:d=0.5" if is_last else "")
+    command = ["ffmpeg", "-y"]
+    if frame is None:
+        command += ["-loop", "1", "-t", str(audio_duration), "-i", image_path]
+        source = "null"
+    else:
+        # The letterboxed frame arrives on stdin as raw rgb24, so nothing is encoded to disk and decoded again.
+        command += ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{VIDEO_WIDTH}x{VIDEO_HEIGHT}", "-framerate", str(FRAME_RATE), "-i", "pipe:0"]
+        source = f"loop=loop=-1:size=1:start=0,setpts=N/{FRAME_RATE}/TB,trim=duration={audio_duration}"
+    command += ["-i", audio_path]
+    if os.path.exists(WATERMARK_PATH):
+        command += ["-i", WATERMARK_PATH, "-filter_complex",
+            f"[0]{source}[src]; [src][2]overlay=(W-w)/2:{WATERMARK_PADDING_TOP}[bg]; [bg]{subtitle_filter},{fades}"]
+    else:
+        command += ["-filter_complex", f"[0]{source},{subtitle_filter},{fades}"]
+    command += encoder_options(profile, threads, keyframe_seconds) + [
+        "-shortest",
+        "-avoid_negative_ts", "make_zero",
+        temp_video
+    ]
+    print(f"Creating scene {i} with watermark & timed subtitles..." if ADD_SUBTITLES else f"Creating scene {i} without subtitles")
+    with span("ffmpeg.encode", scene=i, profile=profile, handoff="file" if frame is None else "raw"):
+        result = subprocess.run(command, input=frame, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, command, stderr=result.stderr.decode(errors="replace"))
+    return temp_video
+
+def join_scene_segments(temp_videos, workspace):
+    with open(workspace.concat_list_path, "w", encoding='utf-8') as f:
+        for temp_video in temp_videos:
+            f.write(f"file '{os.path.abspath(temp_video)}'\n")
+    final_command = [
+        "ffmpeg", "-y",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", workspace.concat_list_path
+    ]
+    if os.path.exists(BG_MUSIC_PATH):
+        # Only the audio is re-encoded to mix in the music; the video segments are still stream-copied.
+        final_command += [
+            "-stream_loop", "-1", "-i", BG_MUSIC_PATH,
+            "-filter_complex", f"[1:a]volume={BG_MUSIC_VOLUME}[bg];[0:a][bg]amix=inputs=2:duration=first:dropout_transition=0:normalize=0[a]",
+            "-map", "0:v", "-map", "[a]",
+            "-c:v", "copy", "-c:a", "aac", "-b:a", "128k"
         ]
-        print("Combining all scenes with background music...")
-        print("Running command:", ' '.join(final_command))
+    else:
+        final_command += ["-c", "copy"]
+    final_command.append(workspace.output_video)
+    print("Joining all scenes...")
+    print("Running command:", ' '.join(final_command))
+    with span("ffmpeg.concat", segments=len(temp_videos)):
         result = subprocess.run(
             final_command, stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
-        if result.returncode != 0:
-            print("FFmpeg stderr output:")
-            print(result.stderr)
-            raise subprocess.CalledProcessError(
-                result.returncode, final_command)
-        print("Video created successfully!")
+    if result.returncode != 0:
+        print("FFmpeg stderr output:")
+        print(result.stderr)
+        raise subprocess.CalledProcessError(
+            result.returncode, final_command)
+    print("Video created successfully!")
+    for temp_video in temp_videos:
+        os.remove(temp_video) if os.path.exists(temp_video) else None
+    os.remove(workspace.concat_list_path)
+
+def generate_video_with_audio_and_subtitles(workspace, workers=SCENE_ENCODE_WORKERS, profile=ENCODER_PROFILE, frames=None):
+    try:
+        subtitles = extract_subtitle_texts_from_srt(workspace.srt_path)
+        audio_files = [f for f in sorted(os.listdir(workspace.audio_dir)) if f.endswith('.mp3')]
+        scene_count = len(audio_files)
+        manifest = load_scene_manifest(workspace.manifest_path)
+        # Durations were measured once from the MP3 frame headers during TTS; ffmpeg is only a fallback.
+        scene_durations = {scene["scene_number"]: scene["duration"] for scene in manifest["scenes"]} if manifest else {}
+        print(f"Found {scene_count} audio files")
+
+        jobs = []
         for i in range(1, scene_count + 1):
-            temp_file = os.path.join(base_dir, f"temp_scene_{i}.mp4")
-            os.remove(temp_file) if os.path.exists(temp_file) else None
-        os.remove(concat_list_path)
+            image_path = scene_image_path(workspace.processed_dir, i)
+            audio_path = os.path.join(workspace.audio_dir, f"scene{i}.mp3")
+            has_image = i in frames if frames is not None else os.path.exists(image_path)
+            if not (has_image and os.path.exists(audio_path)):
+                print(f"Missing files for scene {i}")
+                continue
+            audio_duration = scene_durations.get(i) or fetch_audio_duration_ffmpeg(audio_path)
+            if audio_duration is None:
+                print(f"Could not determine duration for {audio_path}")
+                continue
+            print(f"Processing scene {i} with duration {audio_duration} seconds")
+            subtitle_text = subtitles[i - 1] if ADD_SUBTITLES and i - 1 < len(subtitles) else ""
+            jobs.append((i, image_path, audio_path, audio_duration, subtitle_text, workspace.temp_scene_path(i)))
+        if not jobs:
+            raise Exception("No scenes to encode")
+
+        print(f"Encoding {len(jobs)} scenes on {workers} workers ({ENCODER_THREADS} threads each, {profile} profile)...")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(traced_call(encode_scene, *job, job is jobs[-1], profile, ENCODER_THREADS, frames.get(job[0]) if frames is not None else None)) for job in jobs]
+            temp_videos = [future.result() for future in futures]
+
+        join_scene_segments(temp_videos, workspace)
     except subprocess.CalledProcessError as e:
         print(f"FFmpeg Error: {e}")
-        print("Command output:", e.output if hasattr(e, 'output') else 'No output available')
-    except Exception as e:
-        print(f"Error: {e}")
+        print("Command output:", e.stderr if e.stderr else 'No output available')
+        raise
+
+def build_single_pass_command(scenes, output_dir, output_video):
+    command = ["ffmpeg", "-y"]
+    filters = []
+    concat_inputs = ""
+    subtitle_filters = []
+    current_time = 0.0
+    for k, scene in enumerate(scenes):
+        image_path = scene_image_path(output_dir, scene['scene_number'])
+        duration = scene["duration"]
+        command += ["-loop", "1", "-framerate", str(FRAME_RATE), "-t", str(duration), "-i", image_path, "-i", scene["audio_path"]]
+        filters.append(f"[{2 * k}:v]scale={VIDEO_WIDTH}:{VIDEO_HEIGHT},setsar=1,fps={FRAME_RATE},format=yuv420p[v{k}]")
+        # Pad/trim every narration to its image's length so the concat segments stay aligned.
+        filters.append(f"[{2 * k + 1}:a]aresample=44100,aformat=channel_layouts=stereo,apad,atrim=0:{duration}[a{k}]")
+        concat_inputs += f"[v{k}][a{k}]"
+        if ADD_SUBTITLES:
+            wrapped_subtitles = wrap_text_for_subtitles(scene["text"].replace('\n', ' '), max_width=VIDEO_WIDTH - 40)
+            subtitle_filter = build_subtitle_filter(wrapped_subtitles, duration, current_time)
+            subtitle_filters.append(subtitle_filter) if subtitle_filter != "null" else None
+        current_time += duration
+    total_duration = current_time
+    next_input = 2 * len(scenes)
+
+    filters.append(f"{concat_inputs}concat=n={len(scenes)}:v=1:a=1[vc][ac]")
+    video_label = "vc"
+    if os.path.exists(WATERMARK_PATH):
+        command += ["-i", WATERMARK_PATH]
+        filters.append(f"[vc][{next_input}]overlay=(W-w)/2:{WATERMARK_PADDING_TOP}[vw]")
+        video_label = "vw"
+        next_input += 1
+    filters.append(
+        f"[{video_label}]{','.join(subtitle_filters + [''])}"
+        f"fade=t=in:st=0:d=1,fade=t=out:st={total_duration - 0.5}:d=0.5[v]"
+    )
+    if os.path.exists(BG_MUSIC_PATH):
+        command += ["-stream_loop", "-1", "-i", BG_MUSIC_PATH]
+        filters.append(f"[{next_input}:a]volume={BG_MUSIC_VOLUME},atrim=0:{total_duration}[bg]")
+        filters.append("[ac][bg]amix=inputs=2:duration=first:dropout_transition=0:normalize=0[a]")
+    else:
+        filters.append("[ac]anull[a]")
+
+    command += [
+        "-filter_complex", ";".join(filters),
+        "-map", "[v]", "-map", "[a]",
+        *encoder_options(threads=os.cpu_count() or 1),
+        "-t", str(total_duration),
+        output_video
+    ]
+    return command
+
+def generate_video_single_pass(workspace):
+    manifest = load_scene_manifest(workspace.manifest_path)
+    if not manifest or not manifest["scenes"]:
+        raise ValueError(f"No scene manifest at {workspace.manifest_path}")
+    scenes = [scene for scene in manifest["scenes"] if os.path.exists(scene_image_path(workspace.processed_dir, scene['scene_number'])) and os.path.exists(scene["audio_path"])]
+    if len(scenes) != len(manifest["scenes"]):
+        print(f"Missing files for {len(manifest['scenes']) - len(scenes)} scenes")
+    if not scenes:
+        raise ValueError("No scenes with both an image and audio")
+    command = build_single_pass_command(scenes, workspace.processed_dir, workspace.output_video)
+    print(f"Encoding {len(scenes)} scenes in a single ffmpeg pass...")
+    with span("ffmpeg.single_pass", scenes=len(scenes)):
+        result = subprocess.run(command, stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        print("FFmpeg stderr output:")
+        print(result.stderr)
+        raise subprocess.CalledProcessError(result.returncode, command, stderr=result.stderr)
+    print("Video created successfully!")
+
+def render_short(workspace, frames=None):
+    manifest = load_scene_manifest(workspace.manifest_path)
+    if frames is not None:
+        # Raw frames can only be piped into one ffmpeg process each, so they always take the per-scene path.
+        generate_video_with_audio_and_subtitles(workspace, frames=frames)
+        return
+    if manifest and len(manifest["scenes"]) > SINGLE_PASS_MAX_SCENES:
+        print(f"{len(manifest['scenes'])} scenes is too many for one filtergraph, encoding scenes in parallel")
+        generate_video_with_audio_and_subtitles(workspace)
+        return
+    try:
+        generate_video_single_pass(workspace)
+    except (subprocess.CalledProcessError, ValueError, OSError) as e:
+        print(f"Single-pass render failed ({e}), falling back to per-scene encoding")
+        generate_video_with_audio_and_subtitles(workspace)
@@ -0,0 +1,69 @@
+import os
+import uuid
+import shutil
+from dataclasses import dataclass, field
+
+WORKSPACE_ROOT = os.environ.get("VIDEO_WORKSPACE_ROOT", "workspaces")
+
+
+@dataclass
+class JobWorkspace:
+    """Every file one video job reads or writes. JobWorkspace(".") is the old shared layout in the working directory."""
+    root: str = "."
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    @classmethod
+    def create(cls, base_dir=WORKSPACE_ROOT, job_id=None):
+        job_id = job_id or uuid.uuid4().hex
+        workspace = cls(os.path.join(base_dir, job_id), job_id)
+        os.makedirs(workspace.root, exist_ok=True)
+        return workspace
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    @property
+    def images_dir(self):
+        return self.path("images")
+
+    @property
+    def processed_dir(self):
+        return self.path("images_processed")
+
+    @property
+    def audio_dir(self):
+        return self.path("audios")
+
+    @property
+    def srt_path(self):
+        return self.path("subtitles.srt")
+
+    @property
+    def manifest_path(self):
+        return self.path("scene_manifest.json")
+
+    @property
+    def concat_list_path(self):
+        return self.path("concat_list.txt")
+
+    @property
+    def output_video(self):
+        return self.path("output_video.mp4")
+
+    @property
+    def hls_dir(self):
+        return self.path("hls")
+
+    def temp_scene_path(self, scene_number):
+        return self.path(f"temp_scene_{scene_number}.mp4")
+
+    def cleanup(self):
+        if not os.path.isdir(self.root):
+            return
+        shutil.rmtree(self.processed_dir, ignore_errors=True)
+        for filename in os.listdir(self.root):
+            if filename.startswith("temp_scene_") or filename == "concat_list.txt":
+                os.remove(self.path(filename))
+
+    def discard(self):
+        shutil.rmtree(self.root, ignore_errors=True)
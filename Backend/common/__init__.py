@@ -0,0 +1 @@
+"""Code shared by Manim_Viz and Video_Gen. Each service keeps its own defaults in its utils package and imports the rest from here."""
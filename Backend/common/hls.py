@@ -0,0 +1,230 @@
+"""HLS output shared by both services: parts of a video (Manim chapters, short scenes) are segmented as soon as they are
+ready and appended, in their final order, to a live playlist per rendition.
+
+Every part goes in after an EXT-X-DISCONTINUITY, since each one is a separately encoded file. finish() adds
+EXT-X-ENDLIST, which turns the live EVENT playlist into the final one. Each service subclasses HLSWriter with its own
+part label and environment defaults in its utils/hls.py.
+"""
+import math
+import os
+import subprocess
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MASTER_PLAYLIST = "master.m3u8"
+MEDIA_PLAYLIST = "index.m3u8"
+# Quality of a source-size rendition that is re-encoded only to place keyframes on segment boundaries.
+HLS_SOURCE_CRF = 18
+
+@dataclass
+class Rendition:
+    name: str
+    height: Optional[int] = None
+    video_bitrate: Optional[str] = None
+    audio_bitrate: str = "128k"
+
+    @property
+    def copy(self) -> bool:
+        return self.height is None
+
+@dataclass
+class Segment:
+    uri: str
+    duration: float
+    size: int
+    discontinuity: bool = False
+
+def parse_renditions(spec: str) -> List[Rendition]:
+    """Comma-separated name:height:video_bitrate[:audio_bitrate]; empty keeps one rendition at the parts' own size."""
+    renditions = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        fields = item.split(":")
+        if len(fields) not in (3, 4):
+            raise ValueError(f"Invalid HLS rendition {item!r}, expected name:height:video_bitrate[:audio_bitrate]")
+        renditions.append(Rendition(fields[0], int(fields[1]), fields[2], *fields[3:]))
+    return renditions or [Rendition("source")]
+
+def parse_media_playlist(path: str) -> List[tuple]:
+    """(uri, duration) of every segment ffmpeg listed in a VOD media playlist."""
+    entries, duration = [], None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",")[0])
+            elif line and not line.startswith("#") and duration is not None:
+                entries.append((line, duration))
+                duration = None
+    return entries
+
+def write_atomic(path: str, text: str):
+    # Players re-fetch live playlists while we append, so they must never see a half-written file.
+    staging = f"{path}.part"
+    with open(staging, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(staging, path)
+
+class HLSWriter:
+    """Segments parts into HLS as they become ready and keeps a live playlist per rendition.
+
+    Parts can be added in any order from any thread; they are segmented and appended strictly in the order given to
+    the constructor. output_dir belongs to this one stream: segments are never rewritten, so they can be served as
+    immutable. Subclasses set label, and copy_source=False when the parts' own keyframes don't fall on segment
+    boundaries, which re-encodes the source-size rendition too.
+    """
+
+    label = "part"
+    copy_source = True
+
+    def __init__(self, output_dir: str, order: List[int], renditions: List[Rendition], segment_seconds: float, background_music: Optional[str] = None, music_volume: float = 0.1, on_append: Optional[Callable[[int], None]] = None):
+        self.output_dir = output_dir
+        # Part numbers come from the caller, so they are drained in its order rather than counted from 1.
+        self.order = list(order)
+        self.renditions = renditions
+        self.segment_seconds = segment_seconds
+        # RFC 8216 forbids the target duration from changing mid-stream, so it is fixed here and keyframes are forced to fit it.
+        self.target_duration = math.ceil(segment_seconds)
+        self.background_music = background_music if background_music and os.path.exists(background_music) else None
+        self.music_volume = music_volume
+        self.on_append = on_append
+        self.segments: Dict[str, List[Segment]] = {rendition.name: [] for rendition in self.renditions}
+        self.duration = 0.0
+        self.appended = 0
+        self.finished = False
+        self._pending: Dict[int, Optional[str]] = {}
+        self._position = 0
+        self._draining = False
+        self._lock = threading.Lock()
+        if os.path.exists(os.path.join(output_dir, MASTER_PLAYLIST)):
+            raise FileExistsError(f"{output_dir} already holds a stream")
+        for rendition in self.renditions:
+            os.makedirs(os.path.join(output_dir, rendition.name), exist_ok=True)
+
+    @property
+    def master_path(self) -> str:
+        return os.path.join(self.output_dir, MASTER_PLAYLIST)
+
+    def add(self, number: int, source: Optional[str]):
+        """Hand over part number's video, or None when the part failed and the stream should skip it."""
+        if number not in self.order:
+            logger.warning(f"{self.label.capitalize()} {number} is not part of this stream, ignoring it")
+            return
+        with self._lock:
+            self._pending[number] = source
+            if self._draining:
+                return
+            self._draining = True
+        # Whoever fills the gap at the head of the queue appends every part that is now contiguous.
+        while True:
+            with self._lock:
+                if self._position == len(self.order) or self.order[self._position] not in self._pending:
+                    self._draining = False
+                    return
+                number = self.order[self._position]
+                source = self._pending.pop(number)
+                self._position += 1
+            if source:
+                try:
+                    self._append(number, source)
+                except Exception as e:
+                    logger.error(f"Could not segment {self.label} {number} for HLS, skipping it: {getattr(e, 'stderr', None) or e}")
+
+    def finish(self) -> str:
+        if not self.appended:
+            raise ValueError(f"No {self.label}s were segmented")
+        self.finished = True
+        self._write_playlists()
+        return self.master_path
+
+    def total_bytes(self) -> int:
+        return sum(segment.size for segments in self.segments.values() for segment in segments)
+
+    def _segment(self, rendition: Rendition, number: int, source: str, start: float) -> List[Segment]:
+        directory = os.path.join(self.output_dir, rendition.name)
+        part_playlist = os.path.join(directory, f"{self.label}{number:03d}.m3u8")
+        command = ["ffmpeg", "-y", "-v", "error", "-i", source]
+        if self.background_music:
+            # Music is mixed per part, picked up where the previous part left it, so the stream sounds like the joined MP4.
+            command += [
+                "-stream_loop", "-1", "-i", self.background_music,
+                "-filter_complex", f"[1:a]volume={self.music_volume},atrim=start={start:.3f},asetpts=PTS-STARTPTS[bg];"
+                                   f"[0:a][bg]amix=inputs=2:duration=first:dropout_transition=0:normalize=0[a]",
+                "-map", "0:v", "-map", "[a]",
+            ]
+        else:
+            command += ["-map", "0:v", "-map", "0:a?"]
+        keyframes = ["-force_key_frames", f"expr:gte(t,n_forced*{self.segment_seconds})", "-pix_fmt", "yuv420p"]
+        if rendition.copy and self.copy_source:
+            command += ["-c:v", "copy"]
+        elif rendition.copy:
+            command += ["-c:v", "libx264", "-preset", "veryfast", "-crf", str(HLS_SOURCE_CRF)] + keyframes
+        else:
+            bitrate = rendition.video_bitrate
+            command += [
+                "-vf", f"scale=-2:{rendition.height}",
+                "-c:v", "libx264", "-preset", "veryfast", "-b:v", bitrate, "-maxrate", bitrate, "-bufsize", bitrate,
+            ] + keyframes
+        command += ["-c:a", "copy"] if rendition.copy and not self.background_music else ["-c:a", "aac", "-b:a", rendition.audio_bitrate]
+        command += [
+            # Continuous timestamps across parts, so players that ignore discontinuities still keep time.
+            "-output_ts_offset", f"{start:.6f}",
+            "-f", "hls", "-hls_time", str(self.segment_seconds), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(directory, f"{self.label}{number:03d}_%03d.ts"),
+            part_playlist
+        ]
+        subprocess.run(command, capture_output=True, text=True, check=True)
+        segments = [
+            Segment(uri, duration, os.path.getsize(os.path.join(directory, uri)))
+            for uri, duration in parse_media_playlist(part_playlist)
+        ]
+        os.remove(part_playlist)
+        return segments
+
+    def _append(self, number: int, source: str):
+        start = self.duration
+        with ThreadPoolExecutor(max_workers=len(self.renditions)) as executor:
+            results = list(executor.map(lambda rendition: self._segment(rendition, number, source, start), self.renditions))
+        for rendition, segments in zip(self.renditions, results):
+            if segments and self.segments[rendition.name]:
+                segments[0].discontinuity = True
+            self.segments[rendition.name].extend(segments)
+        self.duration += sum(segment.duration for segment in results[0])
+        self.appended += 1
+        self._write_playlists()
+        logger.info(f"{self.label.capitalize()} {number} streamed as HLS ({self.duration:.1f}s in the playlist)")
+        if self.on_append:
+            self.on_append(number)
+
+    def _media_playlist(self, segments: List[Segment]) -> str:
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{self.target_duration}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for segment in segments:
+            if segment.discontinuity:
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines += [f"#EXTINF:{segment.duration:.3f},", segment.uri]
+        if self.finished:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def _master_playlist(self) -> str:
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        for rendition in self.renditions:
+            segments = self.segments[rendition.name]
+            peak = max((segment.size * 8 / segment.duration for segment in segments if segment.duration), default=0)
+            lines += [f"#EXT-X-STREAM-INF:BANDWIDTH={max(1, math.ceil(peak))}", f"{rendition.name}/{MEDIA_PLAYLIST}"]
+        return "\n".join(lines) + "\n"
+
+    def _write_playlists(self):
+        for rendition in self.renditions:
+            write_atomic(os.path.join(self.output_dir, rendition.name, MEDIA_PLAYLIST), self._media_playlist(self.segments[rendition.name]))
+        write_atomic(self.master_path, self._master_playlist())
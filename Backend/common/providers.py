@@ -0,0 +1,298 @@
+"""Shared budget for calls to external AI providers.
+
+Every provider gets requests- and tokens-per-minute buckets, an AIMD concurrency limit that backs off on 429s,
+timeouts and latency spikes, jittered exponential retries that honor Retry-After, and optional hedging of slow
+requests. Each service passes its own per-provider defaults to a ProviderRegistry; any of them can be overridden with
+PROVIDER_<NAME>_RPM / _TPM / _CONCURRENCY / _MAX_CONCURRENCY / _HEDGE / _RETRIES.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import httpx
+
+from common.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# 429 and overload answers mean "slow down"; the other retryable statuses are worth another try but say nothing about our rate.
+THROTTLE_STATUSES = {429, 503, 529}
+RETRYABLE_STATUSES = THROTTLE_STATUSES | {408, 425, 500, 502, 504}
+BACKOFF_BASE = float(os.environ.get("PROVIDER_BACKOFF_BASE", 0.5))
+BACKOFF_CAP = float(os.environ.get("PROVIDER_BACKOFF_CAP", 30))
+DECREASE_COOLDOWN = 2.0
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+SLOW_FACTOR = 3.0
+HEDGE_QUANTILE = 0.95
+HEDGE_BUDGET = 0.1
+
+# (requests/min, tokens/min, initial concurrency, max concurrency, hedge) for a provider without defaults; 0 means unlimited.
+DEFAULT_LIMITS = (0, 0, 4, 16, False)
+
+def estimate_tokens(text: str, expected_output: int = 0) -> int:
+    return len(text) // 4 + expected_output
+
+def http_status(outcome: Any) -> Optional[int]:
+    """Status of a returned response, or of the response behind an httpx / pydantic-ai error."""
+    status = getattr(outcome, "status_code", None)
+    response = getattr(outcome, "response", None)
+    return status if status is not None else getattr(response, "status_code", None)
+
+def retry_after(outcome: Any) -> Optional[float]:
+    response = getattr(outcome, "response", None) if isinstance(outcome, BaseException) else outcome
+    value = getattr(response, "headers", {}).get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def is_retryable(outcome: Any) -> bool:
+    if isinstance(outcome, (httpx.TransportError, OSError, TimeoutError)):
+        return True
+    return http_status(outcome) in RETRYABLE_STATUSES
+
+def backoff_delay(attempt: int, wait: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; a server-provided Retry-After is a floor, jittered so callers don't return in lockstep."""
+    if wait is not None:
+        return wait + random.uniform(0, BACKOFF_BASE)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+class TokenBucket:
+    """Callers reserve ahead and sleep off their debt, so waiting callers are admitted in order without a lock held across awaits."""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 6):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount: float):
+        """Give back an over-estimate, or charge an under-estimate when amount is negative."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class AdaptiveConcurrency:
+    """AIMD limit on requests in flight: grows by one per limit's worth of successes, halves on congestion."""
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.limit = float(min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+    async def __aenter__(self):
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:
+                    # We were woken and then cancelled; pass the wake-up on so the slot isn't lost.
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+    async def __aexit__(self, *exc_info):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def increase(self):
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._wake()
+
+    def decrease(self):
+        # One halving per cool-down, so a burst of 429s from the same overload doesn't collapse the limit to the floor.
+        now = time.monotonic()
+        if now - self._last_decrease >= DECREASE_COOLDOWN:
+            self.limit = max(self.minimum, self.limit / 2)
+            self._last_decrease = now
+
+class Provider:
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0, concurrency: int = 4, max_concurrency: int = 16, hedge: bool = False, retries: int = 4):
+        self.name = name
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.concurrency = AdaptiveConcurrency(concurrency, max_concurrency)
+        self.hedge = hedge
+        self.retries = retries
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.paused_until = 0.0
+        self.counts = {"calls": 0, "retries": 0, "throttled": 0, "hedges": 0, "hedge_wins": 0}
+
+    @classmethod
+    def from_env(cls, name: str, defaults: Tuple[int, int, int, int, bool] = DEFAULT_LIMITS) -> "Provider":
+        rpm, tpm, concurrency, max_concurrency, hedge = defaults
+        prefix = f"PROVIDER_{name.upper()}_"
+        return cls(
+            name,
+            rpm=int(os.environ.get(prefix + "RPM", rpm)),
+            tpm=int(os.environ.get(prefix + "TPM", tpm)),
+            concurrency=int(os.environ.get(prefix + "CONCURRENCY", concurrency)),
+            max_concurrency=int(os.environ.get(prefix + "MAX_CONCURRENCY", max_concurrency)),
+            hedge=os.environ.get(prefix + "HEDGE", "1" if hedge else "0") == "1",
+            retries=int(os.environ.get(prefix + "RETRIES", 4)),
+        )
+
+    def latency_quantile(self, quantile: float) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[int(quantile * (len(ordered) - 1))]
+
+    def _budget_delay(self, tokens: int) -> float:
+        delay = self.paused_until - time.monotonic()
+        if self.request_bucket:
+            delay = max(delay, self.request_bucket.reserve())
+        if self.token_bucket and tokens:
+            delay = max(delay, self.token_bucket.reserve(tokens))
+        return max(delay, 0.0)
+
+    def _feedback(self, outcome: Any, latency: Optional[float] = None):
+        if http_status(outcome) in THROTTLE_STATUSES or isinstance(outcome, httpx.TimeoutException):
+            self.counts["throttled"] += 1
+            self.concurrency.decrease()
+            wait = retry_after(outcome)
+            if wait:
+                # Retry-After applies to everyone sharing the key, not just the caller that got it.
+                self.paused_until = max(self.paused_until, time.monotonic() + wait)
+        elif latency is not None and http_status(outcome) not in RETRYABLE_STATUSES:
+            slow = len(self.latencies) >= MIN_LATENCY_SAMPLES and latency > SLOW_FACTOR * self.latency_quantile(0.5)
+            self.latencies.append(latency)
+            if slow:
+                self.concurrency.decrease()
+            else:
+                self.concurrency.increase()
+
+    def _settle(self, estimate: int, result: Any):
+        usage = getattr(result, "usage", None)
+        usage = usage() if callable(usage) else usage
+        actual = getattr(usage, "total_tokens", None)
+        if self.token_bucket and estimate and actual:
+            self.token_bucket.refund(estimate - actual)
+
+    async def _attempt(self, request: Callable[[], Awaitable[Any]], tokens: int) -> Any:
+        delay = self._budget_delay(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+        async with self.concurrency:
+            start = time.monotonic()
+            try:
+                result = await request()
+            except Exception as e:
+                self._feedback(e)
+                raise
+            self._feedback(result, time.monotonic() - start)
+            return result
+
+    async def _hedged(self, request: Callable[[], Awaitable[Any]], tokens: int) -> Any:
+        primary = asyncio.ensure_future(self._attempt(request, tokens))
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=self.latency_quantile(HEDGE_QUANTILE))
+        if done or self.counts["hedges"] >= HEDGE_BUDGET * self.counts["calls"]:
+            return await primary
+        self.counts["hedges"] += 1
+        backup = asyncio.ensure_future(self._attempt(request, tokens))
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer a success; only give up on an error once the other attempt has failed too.
+                for finished in sorted(done, key=lambda task: task.exception() is not None):
+                    if finished.exception() is None or not pending:
+                        if finished is backup and finished.exception() is None:
+                            self.counts["hedge_wins"] += 1
+                        return finished.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, request: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """Run request(), a zero-argument coroutine factory, within this provider's budget.
+
+        Throttles, 5xx answers and transport errors are retried. A returned response that is still retryable after
+        the last attempt is handed back as is, so callers keep their own status handling.
+        """
+        self.counts["calls"] += 1
+        for attempt in range(self.retries + 1):
+            with span("provider", provider=self.name, attempt=attempt + 1) as current:
+                try:
+                    outcome = await (self._hedged(request, tokens) if self.hedge else self._attempt(request, tokens))
+                except Exception as e:
+                    if attempt == self.retries or not is_retryable(e):
+                        raise
+                    outcome = e
+                current.set(status=http_status(outcome))
+                if not is_retryable(outcome) or attempt == self.retries:
+                    self._settle(tokens, outcome)
+                    return outcome
+            self.counts["retries"] += 1
+            delay = backoff_delay(attempt, retry_after(outcome))
+            logger.warning(f"{self.name} request failed ({http_status(outcome) or type(outcome).__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counts, "limit": round(self.concurrency.limit, 2), "in_flight": self.concurrency.in_flight}
+
+class ProviderRegistry:
+    """One Provider per name, created on first use from the service's defaults and the environment."""
+
+    def __init__(self, defaults: Dict[str, Tuple[int, int, int, int, bool]]):
+        self.defaults = defaults
+        self._providers: Dict[str, Provider] = {}
+
+    def get(self, name: str) -> Provider:
+        if name not in self._providers:
+            self._providers[name] = Provider.from_env(name, self.defaults.get(name, DEFAULT_LIMITS))
+        return self._providers[name]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: provider.stats() for name, provider in self._providers.items()}
+
+    def render_metrics(self) -> str:
+        lines = [
+            "# HELP provider_concurrency_limit Current adaptive concurrency limit per provider.",
+            "# TYPE provider_concurrency_limit gauge",
+        ]
+        stats = self.stats()
+        lines += [f'provider_concurrency_limit{{provider="{name}"}} {values["limit"]}' for name, values in sorted(stats.items())]
+        lines += [
+            "# HELP provider_events_total Calls, retries, throttles and hedges per provider.",
+            "# TYPE provider_events_total counter",
+        ]
+        for name, values in sorted(stats.items()):
+            for event in ("calls", "retries", "throttled", "hedges", "hedge_wins"):
+                lines.append(f'provider_events_total{{provider="{name}",event="{event}"}} {values[event]}')
+        return "\n".join(lines) + "\n"
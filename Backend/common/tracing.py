@@ -0,0 +1,222 @@
+"""Spans for both services: JSON lines, per-stage metrics and, when installed, OpenTelemetry.
+
+Each service calls configure() from its utils/tracing.py with its environment prefix and the attributes its spans
+inherit; shared code such as common/providers.py traces through the same span().
+"""
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+# Children copy these from their parent span, so e.g. a render span knows its job and attempt without threading them through.
+_inherited_attributes: Tuple[str, ...] = ("job_id", "attempt")
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        inherited = {key: parent.attributes[key] for key in _inherited_attributes if parent and key in parent.attributes}
+        self.attributes = {**inherited, **attributes}
+        self.status = "ok"
+        self.start = time.time()
+        self.duration: Optional[float] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+class JsonLinesExporter:
+    """Appends spans to one open file from a background thread, so closing a span never waits on the disk.
+
+    The file is opened by the first export(), so an unwritable path surfaces there. After an open or write failure
+    the exporter stops queueing, rather than letting spans pile up behind a writer that is gone.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._queue: "queue.SimpleQueue[Optional[dict]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._failed = False
+
+    def export(self, span: Span):
+        with self._lock:
+            if self._failed:
+                return
+            if self._pid != os.getpid():
+                # A forked worker process inherits the queue but not the thread draining it.
+                self._queue, self._writer, self._pid = queue.SimpleQueue(), None, os.getpid()
+            if self._writer is None:
+                try:
+                    f = open(self.path, "a", encoding="utf-8")
+                except OSError:
+                    self._failed = True
+                    raise
+                self._writer = threading.Thread(target=self._write, args=(f,), name="trace-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+        self._queue.put(span.to_dict())
+
+    def _write(self, f):
+        with f:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    return
+                try:
+                    f.write(json.dumps(record, default=str) + "\n")
+                    if self._queue.empty():
+                        f.flush()
+                except OSError as e:
+                    self._failed = True
+                    logger.warning(f"Could not write spans to {self.path}, no longer exporting them: {e}")
+                    return
+
+    def close(self):
+        if self._writer is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+class StageMetrics:
+    """Per-stage latency histograms and counters, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], list] = {}
+        self._cache: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, span: Span):
+        key = (span.name, span.status)
+        with self._lock:
+            counts = self._histograms.setdefault(key, [0] * len(self.buckets) + [0, 0.0])
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += span.duration
+            if "cache_hit" in span.attributes:
+                cache_key = (span.name, "hit" if span.attributes["cache_hit"] else "miss")
+                self._cache[cache_key] = self._cache.get(cache_key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._cache = {}
+
+    def snapshot(self) -> Dict[str, Tuple[float, int]]:
+        """Total seconds and count per stage, summed over statuses, for benchmark breakdowns."""
+        totals: Dict[str, Tuple[float, int]] = {}
+        with self._lock:
+            for (name, _), counts in self._histograms.items():
+                seconds, count = totals.get(name, (0.0, 0))
+                totals[name] = (seconds + counts[-1], count + counts[-2])
+        return totals
+
+    def render(self) -> str:
+        lines = [
+            "# HELP pipeline_stage_seconds Time spent in each pipeline stage.",
+            "# TYPE pipeline_stage_seconds histogram",
+        ]
+        with self._lock:
+            for (name, status), counts in sorted(self._histograms.items()):
+                labels = f'stage="{name}",status="{status}"'
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f'pipeline_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'pipeline_stage_seconds_bucket{{{labels},le="+Inf"}} {counts[-2]}')
+                lines.append(f"pipeline_stage_seconds_count{{{labels}}} {counts[-2]}")
+                lines.append(f"pipeline_stage_seconds_sum{{{labels}}} {counts[-1]:.6f}")
+            lines += [
+                "# HELP pipeline_cache_lookups_total Cache lookups per stage and result.",
+                "# TYPE pipeline_cache_lookups_total counter",
+            ]
+            for (name, result), count in sorted(self._cache.items()):
+                lines.append(f'pipeline_cache_lookups_total{{stage="{name}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+def _otel_tracer(service: str, env_prefix: str):
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        logger.warning(f"{env_prefix}_TRACE_OTEL is set but opentelemetry is not installed, exporting JSON lines only")
+        return None
+    return trace.get_tracer(service)
+
+exporter: Optional[JsonLinesExporter] = None
+metrics = StageMetrics()
+otel_tracer = None
+
+def configure(service: str, env_prefix: str, inherited_attributes: Tuple[str, ...]):
+    """Read <env_prefix>_TRACE_FILE and <env_prefix>_TRACE_OTEL; JSON lines are off unless a trace file is set."""
+    global exporter, otel_tracer, _inherited_attributes
+    trace_file = os.environ.get(f"{env_prefix}_TRACE_FILE", "")
+    exporter = JsonLinesExporter(trace_file) if trace_file else None
+    otel_tracer = _otel_tracer(service, env_prefix) if os.environ.get(f"{env_prefix}_TRACE_OTEL", "0") == "1" else None
+    _inherited_attributes = tuple(inherited_attributes)
+
+@contextmanager
+def span(name: str, **attributes):
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    otel_context = otel_tracer.start_as_current_span(name) if otel_tracer else None
+    otel_span = otel_context.__enter__() if otel_context else None
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.duration = time.time() - current.start
+        _current_span.reset(token)
+        if otel_span is not None:
+            for key, value in current.attributes.items():
+                otel_span.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+            otel_context.__exit__(None, None, None)
+        metrics.observe(current)
+        if exporter:
+            try:
+                exporter.export(current)
+            except OSError as e:
+                logger.warning(f"Could not export span {name}: {e}")
+
+def traced_call(fn: Callable, *args, **kwargs) -> Callable:
+    """Bind fn to the current span context, for executors that don't propagate contextvars themselves."""
+    return functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def record_usage(current: Span, result: Any):
+    usage = getattr(result, "usage", None)
+    usage = usage() if callable(usage) else usage
+    if usage is not None:
+        current.set(
+            request_tokens=getattr(usage, "request_tokens", None),
+            response_tokens=getattr(usage, "response_tokens", None),
+            total_tokens=getattr(usage, "total_tokens", None),
+        )